@@ -0,0 +1,101 @@
+# benchmarks/bench_analyzer.py
+"""PromptAnalyzer intent/kategori tespiti: eski zincirli `any(kw in ...)` taraması vs tek geçişli
+trie-regex matcher, 100k prompt üzerinde; varsayılan ve genişletilmiş (yüzlerce ipucu) keyword tablosu.
+Ayrıca analyze_prompt döngüsü vs analyze_batch, iki ayrı satırda:
+  unique: tümü farklı prompt'lar - sadece toplu tarama kazancı (Arrow kernel'ları / tek regex geçişi, bincount).
+          pyarrow ile ~2-3x (korpuslu ~3x); factorize, küçük harfe çevirme, kelime sayımı ve DataFrame kurulumu
+          tabanı belirler, 10x'e ulaşmaz.
+  logged: 10k farklı prompt'tan 100k satır - dedup + toplu tarama; ~10x ve üstü sadece tekrar ağırlıklı girdide.
+
+Çalıştırma: python benchmarks/bench_analyzer.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import DEFAULT_PROMPTS, PromptAnalyzer, VectorStore
+
+N_PROMPTS = 100_000
+WORDS = ["bana", "python", "öğret", "makale", "yaz", "veri", "analizi", "için", "prompt", "kod",
+         "hikaye", "nasıl", "sen", "bir", "öğretmen", "rolünde", "oluştur", "fibonacci", "türkiye", "hakkında"]
+
+
+def synthetic_prompts(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12))) for _ in range(n)]
+
+
+def expanded_keywords(per_intent: int, seed: int = 3):
+    rng = random.Random(seed)
+    table = {intent: dict(keywords) for intent, keywords in PromptAnalyzer.INTENT_KEYWORDS.items()}
+    for intent, keywords in table.items():
+        for i in range(per_intent):
+            keywords[f"{intent[:4]}{rng.randrange(10 ** 6)}x{i}"] = 1.0
+    return table
+
+
+def legacy_analyze(prompt: str, table) -> tuple:
+    # Eski akış: _detect_category _detect_intent'i tekrar çağırır -> iki tam tarama
+    def detect_intent(text):
+        lower = text.lower()
+        for intent, keywords in table.items():
+            if any(kw in lower for kw in keywords):
+                return intent
+        return 'general'
+    category = PromptAnalyzer.CATEGORY_BY_INTENT.get(detect_intent(prompt), 'genel')
+    return detect_intent(prompt), category
+
+
+def bench(label: str, table, prompts):
+    analyzer = PromptAnalyzer(table)
+    start = time.perf_counter()
+    for prompt in prompts:
+        legacy_analyze(prompt, table)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for prompt in prompts:
+        intent, _ = analyzer.match_intents(prompt)
+        analyzer.CATEGORY_BY_INTENT.get(intent, 'genel')
+    compiled = time.perf_counter() - start
+    n_keywords = sum(len(k) for k in table.values())
+    print(f"{label:>10} | {n_keywords:>8} | {len(prompts) / legacy:>12.0f} | {len(prompts) / compiled:>12.0f}")
+
+
+def bench_batch(label: str, prompts, corpus=None):
+    analyzer = PromptAnalyzer(corpus=corpus)
+    analyzer.analyze_batch(prompts[:2_000])  # lazy import'lar ve Arrow yolunun tek seferlik kurulumu ölçüm dışında
+    start = time.perf_counter()
+    for prompt in prompts:
+        analyzer.analyze_prompt(prompt)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyzer.analyze_batch(prompts)
+    batch = time.perf_counter() - start
+    print(f"{label:>10} | {len(prompts) / loop:>12.0f} | {len(prompts) / batch:>12.0f} | {loop / batch:>6.1f}x")
+
+
+if __name__ == "__main__":
+    prompts = synthetic_prompts(N_PROMPTS)
+    print(f"{'table':>10} | {'keywords':>8} | {'legacy p/s':>12} | {'trie p/s':>12}")
+    bench("default", PromptAnalyzer.INTENT_KEYWORDS, prompts)
+    bench("x100", expanded_keywords(100), prompts)
+    bench("x400", expanded_keywords(400), prompts)
+
+    # Log'larda aynı prompt'lar tekrar eder: 10k farklı prompt'tan 100k satır
+    rng = random.Random(11)
+    pool = synthetic_prompts(N_PROMPTS // 10, seed=13)
+    logged = [rng.choice(pool) for _ in range(N_PROMPTS)]
+    print()
+    # Nadirlik skoru korpus istatistiği ister - yerleşik örneklerle TF-IDF index'i (Chroma'sız)
+    corpus = VectorStore()
+    corpus.collection = None
+    corpus.add_prompts(DEFAULT_PROMPTS)
+    print(f"{'input':>10} | {'loop p/s':>12} | {'batch p/s':>12} | {'speedup':>7}")
+    bench_batch("unique", prompts)
+    bench_batch("unique+idf", prompts, corpus)
+    bench_batch("logged+idf", logged, corpus)
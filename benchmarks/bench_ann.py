@@ -0,0 +1,66 @@
+# benchmarks/bench_ann.py
+"""IVF ANN index vs brute-force TF-IDF: recall@3 ve QPS, farklı korpus boyutları ve nprobe değerleri.
+
+Çalıştırma: python benchmarks/bench_ann.py [max_korpus]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import IVFIndex, VectorStore, _top_k_indices
+
+N_TOPICS = 200
+TOPIC_WORDS = 40
+VOCAB_SIZE = 20_000
+N_QUERIES = 200
+K = 3
+
+
+def topic_corpus(n: int, seed: int = 42):
+    """Konu yapılı sentetik korpus: her doküman bir konunun kelimeleri + genel gürültü"""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(VOCAB_SIZE)])
+    topics = rng.integers(0, VOCAB_SIZE, size=(N_TOPICS, TOPIC_WORDS))
+    doc_topics = rng.integers(0, N_TOPICS, size=n)
+    topic_part = topics[doc_topics[:, None], rng.integers(0, TOPIC_WORDS, size=(n, 15))]
+    noise_part = rng.integers(0, VOCAB_SIZE, size=(n, 10))
+    words = vocab[np.concatenate([topic_part, noise_part], axis=1)]
+    return [{"prompt": " ".join(row), "type": "general"} for row in words]
+
+
+def exact_search(store: VectorStore, query_matrix, k: int):
+    # Sorgu sorgu - pipeline'daki tek prompt araması ile aynı maliyet
+    return [_top_k_indices((query_matrix[i] @ store.doc_matrix.T).toarray()[0], k) for i in range(query_matrix.shape[0])]
+
+
+if __name__ == "__main__":
+    max_n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    sizes = [n for n in (20_000, 50_000, 100_000, 200_000, 500_000, 1_000_000) if n <= max_n]
+
+    print(f"{'corpus':>9} | {'build s':>7} | {'nprobe':>6} | {'recall@3':>8} | {'ann QPS':>8} | {'exact QPS':>9}")
+    for n in sizes:
+        corpus = topic_corpus(n)
+        store = VectorStore()
+        store.collection = None
+        store.add_prompts(corpus)
+        queries = [corpus[i]["prompt"] for i in np.random.default_rng(1).choice(n, N_QUERIES, replace=False)]
+        query_matrix = store._encode(queries)
+
+        start = time.perf_counter()
+        truth = exact_search(store, query_matrix, K)
+        exact_qps = N_QUERIES / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        index = IVFIndex().fit(store.doc_matrix)
+        build_seconds = time.perf_counter() - start
+
+        for nprobe in (1, 4, 8, 16, 32):
+            start = time.perf_counter()
+            found = index.search(query_matrix, K, nprobe=nprobe)
+            ann_qps = N_QUERIES / (time.perf_counter() - start)
+            recall = np.mean([len(set(rows) & set(expected)) / K for (rows, _), expected in zip(found, truth)])
+            print(f"{n:>9} | {build_seconds:>7.1f} | {nprobe:>6} | {recall:>8.3f} | {ann_qps:>8.0f} | {exact_qps:>9.0f}")
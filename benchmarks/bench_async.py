@@ -0,0 +1,39 @@
+# benchmarks/bench_async.py
+"""aprocess_batch throughput'u vs eşzamanlılık limiti - gecikmesi enjekte edilmiş FakeBackend ile.
+
+Çalıştırma: python benchmarks/bench_async.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import FakeBackend, GeminiPromptLabRAG, ResponseCache
+
+LATENCY = 0.05
+N_REQUESTS = 128
+CONCURRENCY = (1, 2, 4, 8, 16, 32, 64)
+
+
+def build_pipeline(concurrency: int) -> GeminiPromptLabRAG:
+    backend = FakeBackend(latency_mean=LATENCY, latency_jitter=0.0, tokens_per_second=None)
+    # 'example' route'u kapalı - her istek model route'una düşer, async yol ölçülür
+    return GeminiPromptLabRAG(
+        max_concurrency=concurrency, response_cache=ResponseCache(max_entries=1), backend=backend,
+        example_distance=None
+    )
+
+
+if __name__ == "__main__":
+    prompts = [f"prompt {i} için python öğret" for i in range(N_REQUESTS)]
+    print(f"latency={LATENCY * 1000:.0f}ms requests={N_REQUESTS}")
+    print(f"{'concurrency':>11} | {'req/s':>8} | {'ideal':>8}")
+    for concurrency in CONCURRENCY:
+        pipeline = build_pipeline(concurrency)
+        start = time.perf_counter()
+        asyncio.run(pipeline.aprocess_batch(prompts))
+        elapsed = time.perf_counter() - start
+        assert pipeline.routing_stats()['model'] == N_REQUESTS, pipeline.routing_stats()
+        print(f"{concurrency:>11} | {N_REQUESTS / elapsed:>8.1f} | {concurrency / LATENCY:>8.1f}")
@@ -0,0 +1,36 @@
+# benchmarks/bench_batch.py
+"""process_prompt döngüsü vs process_batch throughput karşılaştırması (batch 1 → 1024).
+
+Çalıştırma: python benchmarks/bench_batch.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import GeminiPromptLabRAG
+from bench_tfidf_search import QUERIES, synthetic_corpus
+
+CORPUS_SIZE = 10_000
+BATCH_SIZES = (1, 4, 16, 64, 256, 1024)
+
+
+def throughput(fn, prompts) -> float:
+    start = time.perf_counter()
+    fn(prompts)
+    return len(prompts) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    pipeline = GeminiPromptLabRAG()
+    pipeline.vector_store.collection = None  # Sadece yerel TF-IDF yolunu ölç
+    pipeline.vector_store.add_prompts(synthetic_corpus(CORPUS_SIZE))
+
+    print(f"corpus={CORPUS_SIZE}")
+    print(f"{'batch':>6} | {'loop prompt/s':>14} | {'batch prompt/s':>15}")
+    for size in BATCH_SIZES:
+        prompts = [f"{QUERIES[i % len(QUERIES)]} {i}" for i in range(size)]
+        loop = throughput(lambda ps: [pipeline.process_prompt(p) for p in ps], prompts)
+        batch = throughput(pipeline.process_batch, prompts)
+        print(f"{size:>6} | {loop:>14.1f} | {batch:>15.1f}")
@@ -0,0 +1,51 @@
+# benchmarks/bench_chat_history.py
+"""Uzun sohbet: streamlit_app.py'yi AppTest ile N tur sürer, geçmiş büyüdükçe rerun süresi ve
+session state boyutunu ölçer (fake backend, API anahtarı gerekmez).
+
+Çalıştırma: python benchmarks/bench_chat_history.py [tur_sayısı]
+"""
+import os
+import pickle
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PROMPTLAB_BACKEND", "fake")
+
+from streamlit.testing.v1 import AppTest
+
+TOPICS = ["python", "makale", "hikaye", "veri analizi", "pazarlama", "matematik", "tasarım", "sql"]
+REPORT_EVERY = 50
+RERUNS = 5
+
+
+def send(at: AppTest, prompt: str):
+    next(t for t in at.text_input if t.label == "💬 Prompt").input(prompt)
+    next(b for b in at.button if b.label == "📤").click().run()
+
+
+def rerun_ms(at: AppTest) -> float:
+    # Etkileşimsiz rerun - sadece geçmişin çizim maliyeti
+    start = time.perf_counter()
+    for _ in range(RERUNS):
+        at.run()
+    return (time.perf_counter() - start) / RERUNS * 1000
+
+
+def state_kb(at: AppTest) -> float:
+    state = {key: at.session_state[key] for key in ("messages", "result_store")}
+    return len(pickle.dumps(state)) / 1024
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=600).run()
+
+    print(f"{'turns':>6} | {'messages':>8} | {'rerun ms':>8} | {'state KB':>8} | {'elements':>8}")
+    for turn in range(1, turns + 1):
+        send(at, f"{TOPICS[turn % len(TOPICS)]} hakkında prompt yaz #{turn}")
+        if turn % REPORT_EVERY == 0 or turn == 1:
+            elapsed = rerun_ms(at)
+            print(f"{turn:>6} | {len(at.session_state['messages']):>8} | {elapsed:>8.1f} | "
+                  f"{state_kb(at):>8.1f} | {len(at.markdown):>8}")
@@ -0,0 +1,40 @@
+# benchmarks/bench_import.py
+"""promptlab_model import maliyeti (`python -X importtime`) ve ilk pipeline kurulumu.
+
+Çalıştırma: python benchmarks/bench_import.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime(statement: str) -> dict:
+    """-X importtime çıktısından modül başına kümülatif süreleri (µs) toplar"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if cum.isdigit():
+            cumulative[name] = int(cum)
+    return cumulative
+
+
+def wall_time(statement: str) -> float:
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    times = importtime("import promptlab_model")
+    print(f"import promptlab_model:      {times.get('promptlab_model', 0) / 1000:8.1f} ms (importtime, kümülatif)")
+    heavy = [name for name in ("numpy", "scipy", "sklearn", "chromadb", "pandas", "google.generativeai") if name in times]
+    print(f"import ile yüklenen ağır modüller: {heavy or 'yok'}")
+    print(f"import + get_promptlab():    {wall_time('import promptlab_model as m; m.get_promptlab()') * 1000:8.1f} ms (wall)")
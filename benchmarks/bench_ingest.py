@@ -0,0 +1,60 @@
+# benchmarks/bench_ingest.py
+"""Toplu dataset yükleme: JSONL/CSV/Parquet → VectorStore throughput ve tepe bellek.
+
+Çalıştırma: python benchmarks/bench_ingest.py [satır_sayısı]
+"""
+import csv
+import json
+import os
+import resource
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import VectorStore, ingest_dataset
+from bench_tfidf_search import synthetic_corpus
+
+DUPLICATE_EVERY = 20  # her 20 satırdan biri tekrar
+INVALID_EVERY = 100   # her 100 satırdan biri şemaya uymuyor
+
+
+def write_dataset(path: str, n: int):
+    rows = synthetic_corpus(n)
+    for i in range(0, n, DUPLICATE_EVERY):
+        rows[i] = dict(rows[i - 1], act="Duplicate") if i else rows[i]
+    for i in range(INVALID_EVERY - 1, n, INVALID_EVERY):
+        rows[i] = {"act": "Broken", "type": "general"}
+
+    fmt = os.path.splitext(path)[1]
+    if fmt == ".jsonl":
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    elif fmt == ".csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["act", "prompt", "type"])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        import pandas as pd
+        pd.DataFrame(rows, columns=["act", "prompt", "type"]).to_parquet(path)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"rows={n}")
+        print(f"{'format':>8} | {'rows/s':>10} | {'indexed':>8} | {'dup':>6} | {'invalid':>7} | {'peak MB':>8}")
+        for ext in (".jsonl", ".csv", ".parquet"):
+            path = os.path.join(tmp, "prompts" + ext)
+            write_dataset(path, n)
+            store = VectorStore()
+            store.collection = None  # Sadece TF-IDF index maliyetini ölç
+            stats = ingest_dataset(store, path, progress=None)
+            print(f"{ext[1:]:>8} | {stats['rows_per_second']:>10.0f} | {stats['rows_indexed']:>8} | "
+                  f"{stats['duplicates']:>6} | {stats['invalid']:>7} | {peak_rss_mb():>8.0f}")
@@ -0,0 +1,63 @@
+# benchmarks/bench_memory.py
+"""Doküman depolama bellek karşılaştırması: list[str] + list[dict] vs TextColumn + MetadataColumns.
+
+Çalıştırma: python benchmarks/bench_memory.py
+"""
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy  # noqa: F401 - import maliyeti ölçüme girmesin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import MetadataColumns, TextColumn
+from bench_tfidf_search import VOCAB
+
+ACTS = [f"Role {i}" for i in range(150)]  # awesome-chatgpt-prompts ~150 rol
+TYPES = ["teaching", "coding", "writing", "business", "design", "data"]
+
+
+def synthetic_rows(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    documents = ["Sen bir " + " ".join(rng.choices(VOCAB, k=25)) + f" #{i}" for i in range(n)]
+    metadatas = [{"act": rng.choice(ACTS), "type": rng.choice(TYPES)} for _ in range(n)]
+    return documents, metadatas
+
+
+def measure(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size / 2**20, elapsed
+
+
+if __name__ == "__main__":
+    print(f"{'prompts':>9} | {'list MB':>8} | {'compact MB':>10} | {'ratio':>6} | {'lookup µs':>9}")
+    for n in (10_000, 100_000, 1_000_000):
+        encoded_docs, encoded_metas = synthetic_rows(n)
+        # Satır başına ayrı nesneler (mevcut düzen) - kaynak listelerden kopyalanarak ölçülür
+        _, list_mb, _ = measure(lambda: (
+            [doc.encode("utf-8").decode("utf-8") for doc in encoded_docs],
+            [dict(meta) for meta in encoded_metas],
+        ))
+        (documents, metadatas), compact_mb, _ = measure(lambda: (
+            TextColumn(encoded_docs), MetadataColumns(encoded_metas)
+        ))
+        del encoded_docs, encoded_metas
+
+        rows = random.Random(0).sample(range(n), 1000)
+        start = time.perf_counter()
+        for row in rows:
+            documents[row]
+            metadatas[row]
+        lookup_us = (time.perf_counter() - start) / len(rows) * 1e6
+
+        print(f"{n:>9} | {list_mb:>8.1f} | {compact_mb:>10.1f} | {list_mb / compact_mb:>5.1f}x | {lookup_us:>9.2f}")
@@ -0,0 +1,66 @@
+# benchmarks/bench_submit_latency.py
+"""Tur başına sunucu tarafı süre: gönderim script'i ne kadar bloklar (submit) ve cevap ne zaman
+sohbete düşer (reply). Fake backend, AppTest ile; eski sürümle karşılaştırmak için app yolu verilebilir.
+
+Çalıştırma: python benchmarks/bench_submit_latency.py [tur_sayısı] [app.py]
+    git show <commit>:streamlit_app.py > /tmp/old_app.py
+    python benchmarks/bench_submit_latency.py 30 /tmp/old_app.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("PROMPTLAB_BACKEND", "fake")
+
+from streamlit.testing.v1 import AppTest
+
+TOPICS = ["python", "makale", "hikaye", "veri analizi", "pazarlama", "matematik", "tasarım", "sql"]
+POLL_SECONDS = 0.02
+
+
+def send(at: AppTest, prompt: str) -> float:
+    next(t for t in at.text_input if t.label == "💬 Prompt").input(prompt)
+    start = time.perf_counter()
+    next(b for b in at.button if b.label == "📤").click().run()
+    return time.perf_counter() - start
+
+
+def wait_replies(at: AppTest, count: int):
+    # Fragment polling'i yerine tam run - biten işler toplanır
+    while at.session_state["conversation_count"] < count:
+        time.sleep(POLL_SECONDS)
+        at.run()
+
+
+def percentiles(samples) -> str:
+    p50, p95 = np.percentile(np.array(samples) * 1000, [50, 95])
+    return f"p50 {p50:7.1f} ms | p95 {p95:7.1f} ms"
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    app_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(ROOT, "streamlit_app.py")
+    at = AppTest.from_file(app_path, default_timeout=600).run()
+
+    submit, reply = [], []
+    for turn in range(1, turns + 1):
+        start = time.perf_counter()
+        submit.append(send(at, f"{TOPICS[turn % len(TOPICS)]} hakkında prompt yaz #{turn}"))
+        wait_replies(at, turn)
+        reply.append(time.perf_counter() - start)
+
+    # Art arda 3 prompt: cevap beklenirken gönderim bloklanıyor mu?
+    start = time.perf_counter()
+    burst = [send(at, f"art arda prompt #{i}") for i in range(3)]
+    wait_replies(at, turns + 3)
+    burst_total = time.perf_counter() - start
+
+    print(f"app: {os.path.basename(app_path)}, turns={turns}")
+    print(f"submit (script bloklama) | {percentiles(submit)}")
+    print(f"reply  (cevap sohbette)  | {percentiles(reply)}")
+    print(f"3'lü gönderim: submit {' / '.join(f'{s * 1000:.0f}' for s in burst)} ms, "
+          f"üç cevap {burst_total * 1000:.0f} ms")
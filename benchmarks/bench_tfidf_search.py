@@ -0,0 +1,55 @@
+# benchmarks/bench_tfidf_search.py
+"""TF-IDF fallback arama micro-benchmark'ı: sorgu başına gecikme vs korpus boyutu.
+
+Çalıştırma: python benchmarks/bench_tfidf_search.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import VectorStore
+
+VOCAB = [
+    "python", "öğret", "kod", "yaz", "makale", "analiz", "veri", "tasarım",
+    "matematik", "hikaye", "öğretmen", "adım", "örnek", "açıkla", "rapor",
+    "teacher", "writer", "review", "design", "model", "explain", "step",
+    "business", "content", "student", "sabırlı", "net", "detaylı", "sql", "api",
+]
+QUERIES = ["bana python öğret", "makale yaz", "veri analizi yap", "kod review", "hikaye yaz"]
+
+
+def synthetic_corpus(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [
+        {
+            "act": f"Act {i}",
+            "prompt": "Sen bir " + " ".join(rng.choice(VOCAB) for _ in range(25)) + f" #{i}",
+            "type": rng.choice(["teaching", "coding", "writing", "business"]),
+        }
+        for i in range(n)
+    ]
+
+
+def bench(n: int, repeats: int = 50) -> tuple:
+    """(filtresiz ms/sorgu, type filtreli ms/sorgu)"""
+    store = VectorStore()
+    store.collection = None  # Sadece TF-IDF yolunu ölç
+    store.add_prompts(synthetic_corpus(n))
+
+    timings = []
+    for where in (None, {"type": "coding"}):
+        start = time.perf_counter()
+        for i in range(repeats):
+            store.search_similar_prompts(QUERIES[i % len(QUERIES)], n_results=3, where=where)
+        timings.append((time.perf_counter() - start) / repeats * 1000)
+    return tuple(timings)
+
+
+if __name__ == "__main__":
+    print(f"{'corpus':>10} | {'ms/query':>10} | {'filtered':>10}")
+    for n in (1_000, 10_000, 50_000, 100_000):
+        unfiltered, filtered = bench(n)
+        print(f"{n:>10} | {unfiltered:>10.3f} | {filtered:>10.3f}")
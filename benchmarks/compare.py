@@ -0,0 +1,79 @@
+# benchmarks/compare.py
+"""İki run_suite.py çıktısını karşılaştırır: her sayısal metrik için yüzde değişim ve threshold'u aşan
+gerilemeler. Yön anahtar adından çıkarılır (*_seconds / *_ms / *_mb düşük, qps / recall / *_per_second
+yüksek daha iyi); yönü belli olmayan sayılar sadece listelenir.
+
+Çalıştırma: python benchmarks/compare.py eski.json yeni.json [--threshold 0.1]
+Gerileme varsa çıkış kodu 1 (CI'da kullanılabilir). İki çıktı aynı makinede alınmalı; paylaşımlı / tek
+çekirdekli makinelerde ölçüm gürültüsü %10-15'e çıkabilir, --threshold buna göre ayarlanmalı.
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("_seconds", "_ms", "_mb")
+HIGHER_IS_BETTER = ("qps", "recall@", "_per_second")
+SKIP = ("environment", "config", "wall_seconds", "schema")
+
+
+def flatten(node, prefix=""):
+    """{'a': {'b': 1}} -> {'a.b': 1}; listelerde corpora gibi 'size' alanı olan elemanlar boyutla adlandırılır"""
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        items = ((str(item.get("size", i)) if isinstance(item, dict) else str(i), item) for i, item in enumerate(node))
+    else:
+        if isinstance(node, (int, float)) and not isinstance(node, bool):
+            yield prefix, node
+        return
+    for key, value in items:
+        if not prefix and key in SKIP:
+            continue
+        yield from flatten(value, f"{prefix}.{key}" if prefix else key)
+
+
+def direction(key: str) -> int:
+    """+1: yüksek daha iyi, -1: düşük daha iyi, 0: bilinmiyor"""
+    leaf = key.rsplit(".", 1)[-1]
+    if any(leaf.startswith(token) or leaf.endswith(token) for token in HIGHER_IS_BETTER):
+        return 1
+    if any(leaf.endswith(token) for token in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="gerileme sayılan göreli kötüleşme (0.1 = %%10)")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    base_metrics, new_metrics = dict(flatten(base)), dict(flatten(new))
+
+    print(f"base: {base['environment'].get('commit')}  new: {new['environment'].get('commit')}")
+    regressions = []
+    for key in sorted(base_metrics.keys() & new_metrics.keys()):
+        old, current = base_metrics[key], new_metrics[key]
+        sign = direction(key)
+        change = (current - old) / abs(old) if old else 0.0
+        worse = -sign * change
+        marker = "❌" if sign and worse > args.threshold else ("✅" if sign and -worse > args.threshold else "  ")
+        if marker == "❌":
+            regressions.append(key)
+        print(f"{marker} {key:<55} {old:>12.4g} -> {current:>12.4g}  {change:+7.1%}")
+
+    for key in sorted(base_metrics.keys() ^ new_metrics.keys()):
+        print(f"   {key:<55} sadece {'base' if key in base_metrics else 'new'}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} metrikte >{args.threshold:.0%} gerileme")
+        sys.exit(1)
+    print("\n✅ gerileme yok")
+
+
+if __name__ == "__main__":
+    main()
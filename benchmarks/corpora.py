@@ -0,0 +1,152 @@
+# benchmarks/corpora.py
+"""Benchmark'lar için seed'li sentetik Türkçe/İngilizce prompt korpusları.
+
+- make_corpus: rol + görev + konu + kısıt şablonlarından prompt kütüphanesi. Her prompt'a iki sahte
+  proje adı (hece birleşimi) eklenir - böylece her doküman tek başına tanımlanabilir.
+- make_queries: korpustan örneklenen dokümanların bozulmuş hali (kelime atma, yer değiştirme, harf hatası)
+  ve kaynak dokümanın indeksi - recall@k için yer doğrusu.
+- make_user_prompts: pipeline'a gelen kısa kullanıcı prompt'ları (tekrar oranı ayarlanabilir).
+
+Aynı argümanlar her makinede aynı korpusu üretir.
+"""
+import random
+
+TYPES = ["teaching", "coding", "writing", "business", "design", "data"]
+
+ROLES = {
+    "tr": {
+        "teaching": ["Python öğretmeni", "matematik öğretmeni", "fizik eğitmeni", "dil koçu"],
+        "coding": ["kıdemli yazılım geliştirici", "backend mühendisi", "kod gözden geçiren", "DevOps uzmanı"],
+        "writing": ["akademik yazar", "içerik yazarı", "senarist", "teknik yazar"],
+        "business": ["iş analisti", "pazarlama uzmanı", "ürün yöneticisi", "finans danışmanı"],
+        "design": ["UX tasarımcısı", "grafik tasarımcı", "ürün tasarımcısı", "arayüz tasarımcısı"],
+        "data": ["veri bilimci", "veri mühendisi", "istatistikçi", "makine öğrenmesi uzmanı"],
+    },
+    "en": {
+        "teaching": ["Python teacher", "math tutor", "physics instructor", "language coach"],
+        "coding": ["senior software developer", "backend engineer", "code reviewer", "DevOps specialist"],
+        "writing": ["academic writer", "content writer", "screenwriter", "technical writer"],
+        "business": ["business analyst", "marketing specialist", "product manager", "financial advisor"],
+        "design": ["UX designer", "graphic designer", "product designer", "interface designer"],
+        "data": ["data scientist", "data engineer", "statistician", "machine learning specialist"],
+    },
+}
+
+TASKS = {
+    "tr": {
+        "teaching": ["{topic} konusunu adım adım öğret", "{topic} için alıştırmalar hazırla"],
+        "coding": ["{topic} için temiz ve test edilmiş kod yaz", "{topic} kodunu incele ve iyileştir"],
+        "writing": ["{topic} hakkında makale yaz", "{topic} üzerine bir hikaye kurgula"],
+        "business": ["{topic} için pazar analizi yap", "{topic} için KPI listesi çıkar"],
+        "design": ["{topic} için kullanıcı akışı tasarla", "{topic} ekranı için wireframe öner"],
+        "data": ["{topic} verisini analiz et", "{topic} için tahmin modeli kur"],
+    },
+    "en": {
+        "teaching": ["teach {topic} step by step", "prepare exercises about {topic}"],
+        "coding": ["write clean tested code for {topic}", "review and improve the {topic} code"],
+        "writing": ["write an article about {topic}", "draft a short story about {topic}"],
+        "business": ["run a market analysis for {topic}", "list the KPIs for {topic}"],
+        "design": ["design the user flow for {topic}", "suggest a wireframe for the {topic} screen"],
+        "data": ["analyze the {topic} dataset", "build a forecasting model for {topic}"],
+    },
+}
+
+TOPICS = {
+    "tr": ["yapay zeka", "iklim değişikliği", "e-ticaret", "sağlık", "eğitim", "finans", "oyun", "ulaşım",
+           "enerji", "tarım", "turizm", "müzik", "spor", "güvenlik", "mobil uygulama", "bulut altyapısı",
+           "müşteri desteği", "stok yönetimi", "sosyal medya", "kripto para"],
+    "en": ["artificial intelligence", "climate change", "e-commerce", "healthcare", "education", "finance",
+           "gaming", "transportation", "energy", "agriculture", "tourism", "music", "sports", "security",
+           "mobile apps", "cloud infrastructure", "customer support", "inventory", "social media", "crypto"],
+}
+
+CONSTRAINTS = {
+    "tr": ["örneklerle açıkla", "madde madde yaz", "kısa ve net ol", "resmi bir dil kullan", "kaynak göster",
+           "yeni başlayanlara uygun anlat", "tablo kullan", "adımları numaralandır"],
+    "en": ["explain with examples", "use bullet points", "be short and clear", "use a formal tone",
+           "cite sources", "keep it beginner friendly", "use a table", "number the steps"],
+}
+
+USER_TEMPLATES = {
+    "tr": ["bana {topic} öğret", "{topic} hakkında makale yaz", "{topic} için kod yaz", "{topic} analizi yap",
+           "{topic} için sunum hazırla", "{topic} nedir"],
+    "en": ["teach me {topic}", "write an article about {topic}", "write code for {topic}",
+           "analyze {topic}", "prepare a presentation on {topic}", "what is {topic}"],
+}
+
+_CONSONANTS = "bcdfgklmnprstvyz"
+_VOWELS = {"tr": "aeıioöuü", "en": "aeiou"}
+
+
+def _pseudo_words(n: int, rng: random.Random, language: str):
+    """n adet benzersiz sahte kelime (2-3 hece)"""
+    words = set()
+    while len(words) < n:
+        syllables = rng.randint(2, 3)
+        words.add("".join(rng.choice(_CONSONANTS) + rng.choice(_VOWELS[language]) for _ in range(syllables)))
+    return sorted(words)
+
+
+def _languages(language: str, n: int, rng: random.Random):
+    if language == "mixed":
+        return [rng.choice(("tr", "en")) for _ in range(n)]
+    return [language] * n
+
+
+def make_corpus(n: int, language: str = "mixed", seed: int = 0):
+    """language: 'tr', 'en' veya 'mixed' (yarı yarıya)"""
+    rng = random.Random(seed)
+    n_names = max(200, int(2 * n ** 0.5))
+    names = {lang: _pseudo_words(n_names, rng, lang) for lang in ("tr", "en")}
+
+    corpus = []
+    for i, lang in enumerate(_languages(language, n, rng)):
+        prompt_type = rng.choice(TYPES)
+        role = rng.choice(ROLES[lang][prompt_type])
+        task = rng.choice(TASKS[lang][prompt_type]).format(topic=rng.choice(TOPICS[lang]))
+        first, second = rng.sample(names[lang], 2)
+        constraints = ", ".join(rng.sample(CONSTRAINTS[lang], 2))
+        if lang == "tr":
+            prompt = f"Bir {role} olarak {first} ve {second} projeleri için {task}. {constraints}."
+        else:
+            prompt = f"As a {role}, for the {first} and {second} projects, {task}. {constraints}."
+        corpus.append({"act": role, "prompt": prompt, "type": prompt_type, "language": lang, "id": f"doc-{i}"})
+    return corpus
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def make_queries(corpus, n_queries: int, seed: int = 1, dropout: float = 0.3, typo_rate: float = 0.1):
+    """[(sorgu, kaynak doküman indeksi)] - kaynak dokümanın kelime atılmış / karıştırılmış / hatalı hali"""
+    rng = random.Random(seed)
+    queries = []
+    for source in rng.sample(range(len(corpus)), min(n_queries, len(corpus))):
+        words = [word for word in corpus[source]["prompt"].split() if rng.random() >= dropout]
+        words = [_typo(word, rng) if rng.random() < typo_rate else word for word in words]
+        # Komşu kelime çiftlerinin bir kısmı yer değiştirir
+        for i in range(0, len(words) - 1, 4):
+            if rng.random() < 0.5:
+                words[i], words[i + 1] = words[i + 1], words[i]
+        queries.append((" ".join(words), source))
+    return queries
+
+
+def make_user_prompts(n: int, language: str = "mixed", seed: int = 2, repeat_ratio: float = 0.2):
+    """Kısa kullanıcı prompt'ları; repeat_ratio oranında önceki bir prompt tekrar edilir (cache trafiği)"""
+    rng = random.Random(seed)
+    prompts = []
+    for lang in _languages(language, n, rng):
+        if prompts and rng.random() < repeat_ratio:
+            prompts.append(rng.choice(prompts))
+            continue
+        template = rng.choice(USER_TEMPLATES[lang])
+        prompt = template.format(topic=rng.choice(TOPICS[lang]))
+        if rng.random() < 0.7:
+            prompt += ", " + rng.choice(CONSTRAINTS[lang])
+        prompts.append(prompt)
+    return prompts
@@ -0,0 +1,245 @@
+# benchmarks/run_suite.py
+"""PromptLab benchmark suite - commit'ler arası karşılaştırılabilir JSON çıktı.
+
+Ölçülenler (seed'li sentetik TR/EN korpus, bkz. corpora.py):
+  build     VectorStore.add_prompts süresi (TF-IDF en iyi 3 tekrar, Chroma tek geçiş) ve tracemalloc bellek (tepe / kalıcı)
+  search    search_similar_prompts QPS (n_results=3, en iyi 3 tekrar) ve recall@1/3/10 - sorgu, kaynak dokümanın bozulmuş hali;
+            modlar: tfidf, ann (korpus >= ANN_MIN_DOCS), chroma ve hybrid (korpus <= --dense-max)
+  analyzer  PromptAnalyzer.analyze_prompt döngüsü ve analyze_batch throughput (en iyi 3 tekrar)
+  e2e       process_prompt p50/p95/p99 (FakeBackend, sabit model gecikmesi), route dağılımı, aşama p50'leri
+
+Çalıştırma:
+    python benchmarks/run_suite.py --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/run_suite.py --quick
+    python benchmarks/compare.py results/eski.json results/yeni.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import promptlab_model
+from promptlab_model import (ANN_MIN_DOCS, FakeBackend, GeminiPromptLabRAG, PromptAnalyzer, ResponseCache,
+                             VectorStore)
+from corpora import make_corpus, make_queries, make_user_prompts
+
+SCHEMA_VERSION = 1
+RECALL_KS = (1, 3, 10)
+SEARCH_K = 3
+TIMING_REPEATS = 3  # ucuz ölçümlerde en iyi tekrar (timeit gibi) - tek geçiş gürültülü
+
+PRESETS = {
+    "default": dict(sizes=[1_000, 10_000, 50_000], dense_max=10_000, queries=300,
+                    analyzer_prompts=20_000, e2e_corpus=2_000, e2e_requests=300),
+    "quick": dict(sizes=[1_000, 5_000], dense_max=1_000, queries=100,
+                  analyzer_prompts=5_000, e2e_corpus=1_000, e2e_requests=100),
+}
+
+
+def environment() -> dict:
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except Exception:
+            return None
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": {name: version(name) for name in ("numpy", "scipy", "sklearn", "chromadb", "pandas")},
+    }
+
+
+def percentiles_ms(samples) -> dict:
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+            "mean_ms": float(np.mean(samples) * 1000)}
+
+
+def best_of(fn, repeats: int = TIMING_REPEATS) -> float:
+    """fn()'in en kısa süresi (saniye)"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def build_store(corpus, dense: bool) -> tuple:
+    """(store, saniye) - dense=False ise Chroma kapalı, sadece TF-IDF index'i"""
+    store = VectorStore()
+    if not dense:
+        store.collection = None
+    start = time.perf_counter()
+    store.add_prompts(corpus)
+    return store, time.perf_counter() - start
+
+
+def build_memory_mb(corpus) -> dict:
+    """TF-IDF index'i kurarken Python heap'i (tracemalloc): tepe ve kurulum sonrası kalıcı"""
+    gc.collect()
+    tracemalloc.start()
+    store, _ = build_store(corpus, dense=False)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return {"peak_mb": peak / 2**20, "retained_mb": current / 2**20}
+
+
+def search_metrics(store: VectorStore, corpus, queries, mode: str = None) -> dict:
+    texts = [query for query, _ in queries]
+    expected = [corpus[source]["id"] for _, source in queries]
+    for text in texts[:5]:  # ısınma: lazy refit / ANN / partition kurulumu ölçüme girmesin
+        store.search_similar_prompts(text, max(RECALL_KS), mode=mode)
+
+    qps = len(texts) / best_of(lambda: [store.search_similar_prompts(text, SEARCH_K, mode=mode) for text in texts])
+
+    found = [store.search_similar_prompts(text, max(RECALL_KS), mode=mode) for text in texts]
+    metrics = {"qps": qps, "source": found[0].get("source") if found else None}
+    for k in RECALL_KS:
+        metrics[f"recall@{k}"] = float(np.mean([target in result["ids"][0][:k]
+                                                for target, result in zip(expected, found)]))
+    return metrics
+
+
+def bench_corpus(n: int, args) -> dict:
+    print(f"📚 korpus {n}...", file=sys.stderr)
+    corpus = make_corpus(n, seed=args.seed)
+    queries = make_queries(corpus, args.queries, seed=args.seed + 1)
+    result = {"size": n, "build": {}, "search": {}}
+
+    store, _ = build_store(corpus, dense=False)
+    seconds = best_of(lambda: build_store(corpus, dense=False))
+    result["build"]["tfidf_seconds"] = seconds
+    result["build"]["tfidf_docs_per_second"] = n / seconds
+    result["search"]["tfidf"] = search_metrics(store, corpus, queries)
+    if n >= ANN_MIN_DOCS:
+        store.ann_nprobe = args.ann_nprobe
+        start = time.perf_counter()
+        store._ann_index()
+        result["build"]["ann_seconds"] = time.perf_counter() - start
+        result["search"]["ann"] = search_metrics(store, corpus, queries)
+    del store
+    result["build"]["memory"] = build_memory_mb(corpus)
+
+    if n <= args.dense_max:
+        store, seconds = build_store(corpus, dense=True)
+        if store.collection is not None:
+            result["build"]["chroma_seconds"] = seconds
+            result["build"]["chroma_docs_per_second"] = n / seconds
+            result["search"]["chroma"] = search_metrics(store, corpus, queries, mode="cascade")
+            result["search"]["hybrid"] = search_metrics(store, corpus, queries, mode="hybrid")
+        del store
+    gc.collect()
+    return result
+
+
+def bench_analyzer(args) -> dict:
+    print("🔍 analyzer...", file=sys.stderr)
+    prompts = make_user_prompts(args.analyzer_prompts, seed=args.seed + 2, repeat_ratio=0.0)
+    analyzer = PromptAnalyzer()
+    analyzer.analyze_batch(prompts[:100])  # ısınma: pandas/pyarrow lazy import
+
+    loop_seconds = best_of(lambda: [analyzer.analyze_prompt(prompt) for prompt in prompts])
+    batch_seconds = best_of(lambda: analyzer.analyze_batch(prompts))
+    return {
+        "prompts": len(prompts),
+        "analyze_prompt_per_second": len(prompts) / loop_seconds,
+        "analyze_batch_per_second": len(prompts) / batch_seconds,
+    }
+
+
+def bench_e2e(args) -> dict:
+    print("🎯 end-to-end...", file=sys.stderr)
+    latency = args.model_latency_ms / 1000
+    backend = FakeBackend(latency_mean=latency, latency_jitter=latency / 4, tokens_per_second=None, seed=args.seed)
+    store, _ = build_store(make_corpus(args.e2e_corpus, seed=args.seed), dense=True)
+    rag = GeminiPromptLabRAG(backend=backend, vector_store=store, response_cache=ResponseCache())
+
+    prompts = make_user_prompts(args.e2e_requests, seed=args.seed + 3, repeat_ratio=args.repeat_ratio)
+    for prompt in make_user_prompts(5, seed=args.seed + 4, repeat_ratio=0.0):
+        rag.process_prompt(prompt)  # ısınma
+    rag.metrics = promptlab_model.InMemoryMetrics()
+    rag._metrics_sinks = [rag.metrics]
+
+    samples = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        rag.process_prompt(prompt)
+        samples.append(time.perf_counter() - start)
+
+    snapshot = rag.metrics_snapshot()
+    return dict(
+        percentiles_ms(samples),
+        requests=len(samples),
+        corpus_size=args.e2e_corpus,
+        model_latency_ms=args.model_latency_ms,
+        routes=snapshot["route"],
+        retrieval_sources=snapshot["retrieval_source"],
+        cache=snapshot["cache"],
+        stage_p50_ms={stage: values["p50"] * 1000 for stage, values in snapshot["stages"].items()},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--quick", action="store_true", help="küçük boyutlar (CI / hızlı kontrol)")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")])
+    parser.add_argument("--dense-max", type=int, help="Chroma/hybrid ölçülecek en büyük korpus")
+    parser.add_argument("--queries", type=int)
+    parser.add_argument("--analyzer-prompts", type=int)
+    parser.add_argument("--e2e-corpus", type=int)
+    parser.add_argument("--e2e-requests", type=int)
+    parser.add_argument("--model-latency-ms", type=float, default=20.0)
+    parser.add_argument("--repeat-ratio", type=float, default=0.2)
+    parser.add_argument("--ann-nprobe", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON dosyası (verilmezse stdout)")
+    args = parser.parse_args()
+    for key, value in PRESETS["quick" if args.quick else "default"].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+    started = time.perf_counter()
+    results = {
+        "schema": SCHEMA_VERSION,
+        "environment": environment(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "corpora": [bench_corpus(n, args) for n in args.sizes],
+        "analyzer": bench_analyzer(args),
+        "e2e": bench_e2e(args),
+    }
+    results["wall_seconds"] = time.perf_counter() - started
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"✅ {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
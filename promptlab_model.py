@@ -1,103 +1,1917 @@
 # promptlab_model.py 
-import pandas as pd
-import numpy as np
+import asyncio
+import bisect
+import contextlib
+import functools
+import importlib.util
 import json
-import re
 import os
-from typing import Dict, List, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import chromadb
-
-print("🎯 PROMPTLAB FINAL - Gemini RAG Sistemi yükleniyor...")
-
-# Gemini API - opsiyonel
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-    print("✅ Gemini API kütüphanesi bulundu")
-except ImportError:
-    GEMINI_AVAILABLE = False
-    print("⚠️  Gemini API yüklü değil")
+import hashlib
+import random
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# Ağır bağımlılıklar (numpy, scipy, scikit-learn, chromadb, google.generativeai) ilk kullanımda
+# import edilir - sadece PromptAnalyzer isteyen worker'lar bu maliyeti ödemez.
+
+def gemini_available() -> bool:
+    """Gemini istemcisi (google-generativeai ile gelen google.ai.generativelanguage) kurulu mu -
+    modülü import etmeden kontrol eder"""
+    try:
+        return importlib.util.find_spec("google.ai.generativelanguage") is not None
+    except (ImportError, ValueError):
+        return False
+
+@functools.lru_cache(maxsize=None)
+def _load_generativelanguage():
+    # Gemini API - opsiyonel; SDK'nın public GAPIC istemcileri (anahtar istemci başına verilir)
+    try:
+        from google.ai import generativelanguage
+        return generativelanguage
+    except ImportError:
+        return None
+
+# ==================== METRICS ====================
+# Her istek tek bir olay (dict) olarak sink'lere yazılır:
+#   mode, stages {retrieve, analyze, route, generate, total [, first_chunk]} (saniye), retrieval_source,
+#   route, cache ('hit' / 'miss' / 'skip'), backend, retries, prompt_tokens, output_tokens, error,
+#   index_errors (retrieval sırasında yakalanan index / arama hataları)
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+def estimate_tokens(text: str) -> int:
+    """Yaklaşık token sayısı (kelime + noktalama) - backend'ler kullanım bilgisini döndürmüyor"""
+    return len(re.findall(r"\w+|[^\w\s]", text)) if text else 0
+
+class Histogram:
+    """Sabit sınırlı (Prometheus 'le') histogram; yüzdelikler bucket içinde lineer interpolasyonla"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # son bucket: +Inf
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+class MetricsSink:
+    """Metrik hedefi arayüzü - record(event) her istekte bir kez çağrılır"""
+    
+    def record(self, event: Dict):
+        raise NotImplementedError
+
+class InMemoryMetrics(MetricsSink):
+    """Process içi histogram ve sayaçlar: snapshot() (UI için özet) ve prometheus_text() (/metrics)"""
+    COUNTERS = ('mode', 'retrieval_source', 'route', 'cache', 'backend')
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._stages = {}
+        self._counters = {field: {} for field in self.COUNTERS}
+        self._totals = dict.fromkeys(
+            ('requests', 'retries', 'prompt_tokens', 'output_tokens', 'errors', 'index_errors'), 0
+        )
+        self._lock = threading.Lock()
+    
+    def record(self, event: Dict):
+        with self._lock:
+            for stage, seconds in event.get('stages', {}).items():
+                histogram = self._stages.get(stage)
+                if histogram is None:
+                    histogram = self._stages[stage] = Histogram(self.buckets)
+                histogram.observe(seconds)
+            for field in self.COUNTERS:
+                value = event.get(field)
+                if value is not None:
+                    self._counters[field][value] = self._counters[field].get(value, 0) + 1
+            self._totals['requests'] += 1
+            for field in ('retries', 'prompt_tokens', 'output_tokens', 'index_errors'):
+                self._totals[field] += event.get(field) or 0
+            self._totals['errors'] += 1 if event.get('error') else 0
+    
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    'count': histogram.count,
+                    'mean': histogram.sum / histogram.count,
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                    'p99': histogram.quantile(0.99),
+                }
+                for stage, histogram in self._stages.items()
+            }
+            return dict(self._totals, stages=stages, **{field: dict(counts) for field, counts in self._counters.items()})
+    
+    def prometheus_text(self, prefix: str = 'promptlab') -> str:
+        """Prometheus text exposition formatı (0.0.4)"""
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for field, counts in self._counters.items():
+                lines.append(f"# TYPE {prefix}_{field}_total counter")
+                for value, count in sorted(counts.items()):
+                    lines.append(f'{prefix}_{field}_total{{{field}="{value}"}} {count}')
+            for field, total in self._totals.items():
+                lines.append(f"# TYPE {prefix}_{field}_total counter")
+                lines.append(f"{prefix}_{field}_total {total}")
+        return "\n".join(lines) + "\n"
+
+class JsonLinesMetrics(MetricsSink):
+    """Her olayı bir JSON satırı olarak dosyaya ekler (sonradan analiz / log toplayıcı için)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+    
+    def record(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line + "\n")
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def make_metrics_sinks(jsonl_path: str = None) -> List[MetricsSink]:
+    """Pipeline'a ek metrik hedefleri - şimdilik opsiyonel JSON-lines dosyası"""
+    return [JsonLinesMetrics(jsonl_path)] if jsonl_path else []
+
+class RequestTrace:
+    """Tek isteğin ölçümleri - aşamalar stage() ile sarılır, event() sink'e giden olayı üretir"""
+    
+    def __init__(self, mode: str):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fields = {'mode': mode}
+        # Batch'ten pay alan trace'lerde duvar saati tüm batch'i kapsar - total aşamaların toplamıdır
+        self.shared = False
+    
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+    
+    def mark(self, name: str):
+        """İstek başından bu ana kadar geçen süre (ör. ilk stream parçası)"""
+        self.stages.setdefault(name, time.perf_counter() - self.started)
+    
+    def event(self) -> Dict:
+        total = sum(self.stages.values()) if self.shared else time.perf_counter() - self.started
+        return dict(self.fields, ts=time.time(), stages=dict(self.stages, total=total))
+
+# ==================== EMBEDDINGS ====================
+# Chroma'ya verilen yoğun vektörler burada, yerelde hesaplanır - Chroma'nın varsayılan (indirme gerektiren)
+# embedding modeli hiç kullanılmaz.
+EMBEDDING_BATCH_SIZE = 256
+
+class Embedder:
+    """Metin -> L2-normalize float32 vektör (n, dim). name cache anahtarına ve index hash'ine girer."""
+    name = "base"
+    
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        raise NotImplementedError
+
+class HashingEmbedder(Embedder):
+    """Fit gerektirmeyen, tamamen offline hashed char n-gram vektörleri (Türkçe eklere dayanıklı)"""
+    
+    def __init__(self, dim: int = 512, ngram_range: Tuple[int, int] = (3, 4)):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        
+        self.dim = dim
+        self.name = f"hashing-char{ngram_range[0]}{ngram_range[1]}-{dim}"
+        self._vectorizer = HashingVectorizer(
+            analyzer='char_wb', ngram_range=ngram_range, n_features=dim, alternate_sign=True, norm='l2'
+        )
+    
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+        return self._vectorizer.transform(texts).toarray().astype(np.float32)
+
+class SentenceTransformerEmbedder(Embedder):
+    """Yerel cache'teki sentence-transformers modeli (opsiyonel) - ağa çıkmaz"""
+    
+    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+        from sentence_transformers import SentenceTransformer
+        
+        self.name = f"st-{model_name}"
+        self._model = SentenceTransformer(model_name, local_files_only=True)
+    
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+        return np.asarray(self._model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+def make_embedder(name: str = None) -> Embedder:
+    """'hashing' (varsayılan) veya 'st:<model>' (yerel sentence-transformers modeli)"""
+    if name and name.startswith('st:'):
+        return SentenceTransformerEmbedder(name[3:])
+    if name and name != 'hashing':
+        raise ValueError(f"Bilinmeyen embedder: {name}")
+    return HashingEmbedder()
+
+class EmbeddingCache:
+    """Diskte (SQLite) metin hash'i -> vektör cache'i; embedder adı anahtarın parçasıdır"""
+    
+    def __init__(self, path: str):
+        import sqlite3
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self._lock = threading.Lock()
+    
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        with self._lock:
+            # SQLite parametre limiti altında kalmak için 500'lük parçalar
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                found.update(self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall())
+        return found
+    
+    def put_many(self, items: List[Tuple[str, bytes]]):
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", items)
+            self._db.commit()
+
+class CachedEmbedder(Embedder):
+    """Embedder'ı batch'ler halinde çağırır. Doküman embedding'leri (embed) metin hash'ine göre cache'lenir
+    (bellek + opsiyonel disk) - aynı doküman bir daha hesaplanmaz. Sorgular (embed_queries) diske yazılmaz,
+    sadece küçük bir bellek LRU'sunda tutulur: her farklı kullanıcı sorgusu kalıcı cache'i büyütmez.
+    Varsayılan sınırlar bir Streamlit worker'ı için: 512 boyutlu vektör ~2 KB, 4096 + 1024 giriş ~10 MB."""
+    
+    def __init__(self, embedder: Embedder, cache_path: str = None, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_memory_entries: int = 4_096, max_query_entries: int = 1_024):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.batch_size = batch_size
+        self.max_memory_entries = max_memory_entries
+        self.max_query_entries = max_query_entries
+        self._disk = EmbeddingCache(cache_path) if cache_path else None
+        self._memory = OrderedDict()
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'computed': 0, 'query_hits': 0, 'queries_computed': 0}
+    
+    def _key(self, text: str) -> str:
+        return self.name + ":" + hashlib.sha1(text.encode('utf-8')).hexdigest()
+    
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        """Doküman embedding'leri - bellek, sonra disk; hesaplananlar diske yazılır"""
+        import numpy as np
+        
+        texts = list(texts)
+        keys = [self._key(text) for text in texts]
+        vectors = self._lookup(self._memory, keys, 'memory_hits')
+        
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing and self._disk is not None:
+            found = self._disk.get_many(missing)
+            for key, blob in found.items():
+                vectors[key] = np.frombuffer(blob, dtype=np.float32)
+            with self._lock:
+                self._counters['disk_hits'] += len(found)
+            missing = [key for key in missing if key not in vectors]
+        
+        for batch, computed in self._compute(missing, dict(zip(keys, texts)), 'computed'):
+            vectors.update(zip(batch, computed))
+            if self._disk is not None:
+                self._disk.put_many([(key, vector.tobytes()) for key, vector in zip(batch, computed)])
+        
+        self._remember(self._memory, keys, vectors, self.max_memory_entries)
+        return np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+    
+    def embed_queries(self, texts: List[str]) -> "np.ndarray":
+        """Arama sorgusu embedding'leri - sadece bellek içi küçük LRU, diske yazılmaz"""
+        import numpy as np
+        
+        texts = list(texts)
+        keys = [self._key(text) for text in texts]
+        vectors = self._lookup(self._queries, keys, 'query_hits')
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        for batch, computed in self._compute(missing, dict(zip(keys, texts)), 'queries_computed'):
+            vectors.update(zip(batch, computed))
+        
+        self._remember(self._queries, keys, vectors, self.max_query_entries)
+        return np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+    
+    def _lookup(self, lru: OrderedDict, keys: List[str], counter: str) -> Dict:
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                vector = lru.get(key)
+                if vector is not None:
+                    lru.move_to_end(key)
+                    vectors[key] = vector
+            self._counters[counter] += len(vectors)
+        return vectors
+    
+    def _compute(self, missing: List[str], text_by_key: Dict[str, str], counter: str):
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            yield batch, self.embedder.embed([text_by_key[key] for key in batch])
+        with self._lock:
+            self._counters[counter] += len(missing)
+    
+    def _remember(self, lru: OrderedDict, keys: List[str], vectors: Dict, max_entries: int):
+        with self._lock:
+            for key in keys:
+                lru[key] = vectors[key]
+                lru.move_to_end(key)
+            while len(lru) > max_entries:
+                lru.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, memory_entries=len(self._memory), query_entries=len(self._queries))
 
 # ==================== VECTOR STORE ====================
+# Batch TF-IDF aramasında bir seferde üretilen yoğun skor matrisi hücre sayısı üst sınırı
+SCORE_BLOCK_SIZE = 1 << 22
+# Filtrelenmiş aramalar için bellekte tutulan (satırlar, alt matris) bölüm sayısı
+PARTITION_CACHE_SIZE = 32
+# Index kurulurken bölümleri önceden hazırlanan metadata alanları
+PARTITION_FIELDS = ('type',)
+# Hybrid arama: RRF sabiti ve kaynak başına getirilen aday sayısı çarpanı (n_results * faktör)
+HYBRID_RRF_K = 60
+HYBRID_CANDIDATE_FACTOR = 4
+# ANN (IVF) index'i bu boyutun altındaki korpuslarda kullanılmaz - brute-force zaten hızlı
+ANN_MIN_DOCS = 20_000
+# Diskteki index formatı değişirse artırılır - eski index'ler otomatik rebuild edilir
+INDEX_FORMAT_VERSION = 3
+
+def _prompt_id(prompt_info: Dict) -> str:
+    """Kararlı id: açık 'id' alanı yoksa prompt içeriğinin hash'i"""
+    if prompt_info.get('id'):
+        return str(prompt_info['id'])
+    return hashlib.sha1(prompt_info['prompt'].encode('utf-8')).hexdigest()[:16]
+
+_TURKISH_CHARS = frozenset("çğıöşüÇĞİÖŞÜ")
+_TURKISH_WORDS = frozenset(("bir", "ve", "bana", "için", "ile", "bu", "sen", "nasıl", "hakkında", "yaz", "öğret"))
+
+def _detect_language(text: str) -> str:
+    """Kaba TR/EN ayrımı - Türkçe karakter veya sık Türkçe kelime varsa 'tr'"""
+    if any(char in _TURKISH_CHARS for char in text):
+        return 'tr'
+    return 'tr' if any(word in _TURKISH_WORDS for word in text.lower().split()) else 'en'
+
+def _normalize_where(where: Dict) -> Tuple:
+    """{'type': 'coding', 'language': ['tr', 'en']} -> hashable, sıralı filtre anahtarı (boşsa ())"""
+    if not where:
+        return ()
+    filters = []
+    for field, values in sorted(where.items()):
+        if values is None:
+            continue
+        values = (values,) if isinstance(values, str) else tuple(values)
+        filters.append((field, tuple(sorted(set(values)))))
+    return tuple(filters)
+
+def _chroma_where(filters: Tuple) -> Dict:
+    clauses = [
+        {field: values[0]} if len(values) == 1 else {field: {'$in': list(values)}}
+        for field, values in filters
+    ]
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+def _top_k_indices(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Son eksende en yüksek k skorun indeksleri (azalan sırada) - tam argsort yerine argpartition"""
+    import numpy as np
+    
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=-1)
+
+# Toplu regex taraması: metinler bu ayırıcıyla birleştirilip tek geçişte taranır. Python'da boşluk karakteridir
+# (str.split / \s), token ve kelimeler onu aşamaz; metinlerde geçerse metin başına taramaya düşülür.
+_BATCH_SEPARATOR = "\x1f"
+
+@functools.lru_cache(maxsize=None)
+def _batch_pattern(pattern: "re.Pattern") -> "re.Pattern":
+    # Baştaki global flag grubu (ör. sklearn'ün '(?u)') alternation içinde kalamaz - flags ile taşınır
+    body = re.sub(r"^\(\?[aiLmsux]+\)", "", pattern.pattern)
+    return re.compile(re.escape(_BATCH_SEPARATOR) + "|(?:" + body + ")", pattern.flags)
+
+def _flatten_matches(per_text: List[List[str]]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Metin başına eşleşme listeleri -> (metin indeksi, eşleşme kodu, tekil eşleşmeler)"""
+    import numpy as np
+    import pandas as pd
+    from itertools import chain
+    
+    lengths = np.fromiter(map(len, per_text), dtype=np.int64, count=len(per_text))
+    codes, uniques = pd.factorize(pd.Series(list(chain.from_iterable(per_text)), dtype=object), sort=False)
+    return np.repeat(np.arange(len(per_text)), lengths), codes, np.asarray(uniques, dtype=object)
+
+def _findall_batch(pattern: "re.Pattern", texts: List[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """pattern.findall'ın tüm metinlerdeki sonucu, metin başına findall çağrısı olmadan:
+    (metin indeksi, eşleşme kodu, tekil eşleşmeler). Eşleşmenin metni, kendinden önceki ayırıcı sayısıdır."""
+    import numpy as np
+    import pandas as pd
+    
+    joined = _BATCH_SEPARATOR.join(texts)
+    if pattern.groups or joined.count(_BATCH_SEPARATOR) != len(texts) - 1:
+        return _flatten_matches([pattern.findall(text) for text in texts])
+    
+    codes, uniques = pd.factorize(pd.Series(_batch_pattern(pattern).findall(joined), dtype=object), sort=False)
+    uniques = np.asarray(uniques, dtype=object)
+    separator = np.flatnonzero(uniques == _BATCH_SEPARATOR)
+    is_separator = codes == separator[0] if len(separator) else np.zeros(len(codes), dtype=bool)
+    return np.cumsum(is_separator)[~is_separator], codes[~is_separator], uniques
+
+def _lower_all(texts: List[str]) -> List[str]:
+    # Tek str.lower çağrısı; ayırıcı küçük harfe çevrilmez ve bağlama duyarlı dönüşümleri (ör. son sigma)
+    # metin sonu gibi etkiler
+    joined = _BATCH_SEPARATOR.join(texts)
+    if joined.count(_BATCH_SEPARATOR) != len(texts) - 1:
+        return [text.lower() for text in texts]
+    return joined.lower().split(_BATCH_SEPARATOR)
+
+# Arrow (RE2) yolu: pyarrow kuruluysa toplu taramalar metin başına Python çağrısı olmadan Arrow kernel'larında.
+# RE2'de \s, \d, \w sadece ASCII - sınıflar Python'un tanımından literal aralık olarak üretilir (_unicode_classes)
+_SKLEARN_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+_ARROW_MATCH_MARK = "\x1e"
+# Küçük batch'lerde Arrow'a aktarma ve kernel kurulumu regex geçişinden pahalı (~1k prompt'ta başa baş)
+_ARROW_MIN_BATCH = 1_000
+
+@functools.lru_cache(maxsize=None)
+def _unicode_classes() -> Dict[str, str]:
+    """Python re'nin \\s / \\d / \\w karakterleri, karakter sınıfı içeriği olarak (ör. '\\t-\\r ...').
+    Aralıklar re'nin kendisiyle tüm kod noktaları üzerinden çıkarılır; ilk toplu analizde bir kez kurulur."""
+    import sys
+    
+    def literal(code: int) -> str:
+        char = chr(code)
+        return "\\" + char if char in "\\]^-[" else char
+    
+    everything = "".join(map(chr, range(sys.maxunicode + 1)))
+    classes = {}
+    for name, pattern in (('space', r"\s+"), ('digit', r"\d+"), ('word', r"\w+")):
+        spans = [(match.start(), match.end() - 1) for match in re.finditer(pattern, everything)]
+        classes[name] = "".join(
+            literal(start) if start == end else literal(start) + "-" + literal(end) for start, end in spans
+        )
+    return classes
+
+def _arrow_strings(texts: List[str]):
+    """Metinler Arrow string dizisi olarak; pyarrow yoksa ya da batch küçükse None"""
+    if len(texts) < _ARROW_MIN_BATCH or importlib.util.find_spec("pyarrow") is None:
+        return None
+    import pyarrow as pa
+    return pa.array(texts, type=pa.string())
+
+def _arrow_matches(values, doc: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    # _findall_batch ile aynı biçim: (metin indeksi, eşleşme kodu, tekil eşleşmeler)
+    import numpy as np
+    
+    encoded = values.dictionary_encode()
+    return doc, encoded.indices.to_numpy(zero_copy_only=False), np.asarray(encoded.dictionary.to_pylist(), dtype=object)
+
+def _arrow_word_tokens(strings) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """sklearn'ün varsayılan token_pattern'i = en az 2 karakterlik kelime karakteri dizileri: kelime karakteri
+    olmayanlardan bölünür, kısa parçalar atılır"""
+    import pyarrow.compute as pc
+    
+    parts = pc.split_pattern_regex(strings, f"[^{_unicode_classes()['word']}]+")
+    tokens = pc.list_flatten(parts)
+    keep = pc.greater_equal(pc.utf8_length(tokens), 2)
+    doc = pc.filter(pc.list_parent_indices(parts), keep).to_numpy()
+    return _arrow_matches(pc.filter(tokens, keep), doc)
+
+def _arrow_findall(strings, pattern: str):
+    """RE2 findall karşılığı: eşleşmeler işaret karakteriyle sarılır, işaretten bölünür - tek indeksli parçalar
+    eşleşmelerdir (soldan ilk eşleşme, çakışmasız; Python re.findall ile aynı). İşaret metinlerde geçiyorsa None."""
+    import numpy as np
+    import pyarrow.compute as pc
+    
+    if pc.any(pc.match_substring(strings, _ARROW_MATCH_MARK)).as_py():
+        return None
+    parts = pc.split_pattern(
+        pc.replace_substring_regex(strings, pattern, _ARROW_MATCH_MARK + "\\0" + _ARROW_MATCH_MARK), _ARROW_MATCH_MARK
+    )
+    doc = pc.list_parent_indices(parts).to_numpy()
+    offsets = parts.offsets.to_numpy()
+    matched = (np.arange(len(doc)) - offsets[doc]) % 2 == 1
+    return _arrow_matches(pc.filter(pc.list_flatten(parts), matched), doc[matched])
+
+class CorpusStats:
+    """Index build sırasında bir kez hesaplanan korpus istatistikleri - analyzer skorlamasında kullanılır.
+    Sorgu başına sadece tokenize + dict lookup yapılır (mikrosaniye mertebesi)."""
+    
+    def __init__(self, vocabulary: Dict[str, int], idf: "np.ndarray", tokenize, token_pattern: "re.Pattern" = None):
+        self.tokenize = tokenize
+        # Varsayılan word analyzer'ında (küçük harf + token_pattern) toplu yol regex'i doğrudan kullanır;
+        # sklearn'ün varsayılan pattern'inde pyarrow varsa Arrow yolu
+        self.token_pattern = token_pattern
+        self._default_tokens = token_pattern is not None and token_pattern.pattern == _SKLEARN_TOKEN_PATTERN
+        self.idf = {term: float(idf[col]) for term, col in vocabulary.items()}
+        self.idf_min = float(idf.min()) if len(idf) else 1.0
+        self.idf_max = float(idf.max()) if len(idf) else 1.0
+    
+    @classmethod
+    def from_vectorizer(cls, vectorizer) -> "CorpusStats":
+        plain_words = (
+            vectorizer.analyzer == 'word' and tuple(vectorizer.ngram_range) == (1, 1) and vectorizer.lowercase
+            and vectorizer.preprocessor is None and vectorizer.tokenizer is None
+            and vectorizer.stop_words is None and vectorizer.strip_accents is None
+        )
+        return cls(vectorizer.vocabulary_, vectorizer.idf_, vectorizer.build_analyzer(),
+                   re.compile(vectorizer.token_pattern) if plain_words else None)
+    
+    def rarity(self, text: str) -> float:
+        """Token'ların ortalama IDF'i [0, 1] aralığında; korpusta hiç geçmeyen terim en nadir sayılır"""
+        tokens = self.tokenize(text)
+        if not tokens:
+            return 0.0
+        span = self.idf_max - self.idf_min
+        if span <= 0:
+            return 0.0
+        total = sum(self.idf.get(token, self.idf_max) for token in tokens)
+        return (total / len(tokens) - self.idf_min) / span
+    
+    def rarity_batch(self, texts, lowercase: bool = True) -> "np.ndarray":
+        """rarity'nin toplu hali: tüm metinler tek geçişte token'lanır (Arrow ya da birleştirilmiş metinde tek regex),
+        IDF lookup tekil terim başına bir kez, metin başına ortalama tek bincount. lowercase=False: metinler zaten
+        küçük harf."""
+        import numpy as np
+        
+        texts = list(texts)
+        if self.token_pattern is None:
+            doc, codes, terms = _flatten_matches(list(map(self.tokenize, texts)))
+        else:
+            lowered = _lower_all(texts) if lowercase else texts
+            strings = _arrow_strings(lowered) if self._default_tokens else None
+            if strings is not None:
+                doc, codes, terms = _arrow_word_tokens(strings)
+            else:
+                doc, codes, terms = _findall_batch(self.token_pattern, lowered)
+        span = self.idf_max - self.idf_min
+        if span <= 0 or not len(doc):
+            return np.zeros(len(texts))
+        
+        idf = np.fromiter((self.idf.get(term, self.idf_max) for term in terms), dtype=float, count=len(terms))
+        counts = np.bincount(doc, minlength=len(texts))
+        totals = np.bincount(doc, weights=idf[codes], minlength=len(texts))
+        return np.where(counts > 0, (totals / np.maximum(counts, 1) - self.idf_min) / span, 0.0)
+
+def _reserve(array: "np.ndarray", used: int, needed: int) -> "np.ndarray":
+    """Amortize büyüme (2x); memory-map'ten gelen salt-okunur diziler ilk yazmada belleğe kopyalanır"""
+    import numpy as np
+    
+    if needed <= len(array) and array.flags.writeable:
+        return array
+    grown = np.empty(max(needed, 2 * len(array), 16), dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+class TextColumn:
+    """Sıkı string kolonu: tek UTF-8 buffer + satır başına (start, end) offset'leri.
+    Satır başına Python str nesnesi tutulmaz; str okunurken decode edilir, raw() kopyasız memoryview döner.
+    Güncellenen satırın yeni içeriği buffer sonuna yazılır - boşa düşen byte'lar take() ile temizlenir."""
+    
+    def __init__(self, texts=()):
+        import numpy as np
+        
+        self._buffer = np.empty(0, dtype=np.uint8)
+        self._starts = np.empty(0, dtype=np.int64)
+        self._ends = np.empty(0, dtype=np.int64)
+        self._nbytes = 0
+        self._size = 0
+        self.extend(texts)
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __getitem__(self, row: int) -> str:
+        return str(self.raw(row), 'utf-8')
+    
+    def __iter__(self):
+        view = memoryview(self._buffer)
+        for start, end in zip(self._starts[:self._size].tolist(), self._ends[:self._size].tolist()):
+            yield str(view[start:end], 'utf-8')
+    
+    def raw(self, row: int) -> memoryview:
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        return memoryview(self._buffer)[self._starts[row]:self._ends[row]]
+    
+    def extend(self, texts):
+        import numpy as np
+        
+        encoded = [text.encode('utf-8') for text in texts]
+        if not encoded:
+            return
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        ends = self._nbytes + np.cumsum(lengths)
+        
+        self._buffer = _reserve(self._buffer, self._nbytes, int(ends[-1]))
+        self._buffer[self._nbytes:ends[-1]] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        
+        n = self._size + len(encoded)
+        self._starts = _reserve(self._starts, self._size, n)
+        self._ends = _reserve(self._ends, self._size, n)
+        self._starts[self._size:n] = ends - lengths
+        self._ends[self._size:n] = ends
+        self._nbytes = int(ends[-1])
+        self._size = n
+    
+    def append(self, text: str):
+        self.extend([text])
+    
+    def __setitem__(self, row: int, text: str):
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        size = self._size
+        self.extend([text])
+        self._size = size
+        self._starts[row] = self._starts[size]
+        self._ends[row] = self._ends[size]
+    
+    def take(self, rows) -> "TextColumn":
+        """Seçilen satırlarla (index dizisi veya bool maske) sıkıştırılmış yeni kolon"""
+        import numpy as np
+        
+        rows = np.arange(self._size)[rows]
+        starts, ends = self._starts[rows], self._ends[rows]
+        lengths = ends - starts
+        
+        column = TextColumn()
+        if len(rows):
+            # Satır aralıklarını tek seferde topla: her byte'ın kaynak pozisyonu
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            column._buffer = self._buffer[offsets + np.arange(int(lengths.sum()))]
+            column._ends = np.cumsum(lengths)
+            column._starts = column._ends - lengths
+            column._nbytes = int(lengths.sum())
+            column._size = len(rows)
+        return column
+    
+    def nbytes(self) -> int:
+        return self._buffer.nbytes + self._starts.nbytes + self._ends.nbytes
+    
+    def to_arrays(self) -> Dict[str, "np.ndarray"]:
+        return {
+            'buffer': self._buffer[:self._nbytes],
+            'starts': self._starts[:self._size],
+            'ends': self._ends[:self._size],
+        }
+    
+    @classmethod
+    def from_arrays(cls, buffer: "np.ndarray", starts: "np.ndarray", ends: "np.ndarray") -> "TextColumn":
+        # Diziler memory-map olabilir - yazılmadıkça kopyalanmaz
+        column = cls()
+        column._buffer, column._starts, column._ends = buffer, starts, ends
+        column._nbytes, column._size = len(buffer), len(starts)
+        return column
+
+class MetadataColumns:
+    """Dictionary-encoded metadata: alan başına kategori listesi + int32 kod dizisi (-1 = alan yok).
+    Satır okunurken dict olarak kurulur; filtreler doğrudan codes() üzerinde çalışabilir."""
+    
+    def __init__(self, metadatas=()):
+        self._categories = {}  # alan -> [değer]
+        self._lookup = {}      # alan -> {değer: kod}
+        self._codes = {}       # alan -> np.int32 dizisi
+        self._size = 0
+        self.extend(metadatas)
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __getitem__(self, row: int) -> Dict:
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        metadata = {}
+        for field, codes in self._codes.items():
+            code = codes[row]
+            if code >= 0:
+                metadata[field] = self._categories[field][code]
+        return metadata
+    
+    def __iter__(self):
+        for row in range(self._size):
+            yield self[row]
+    
+    def _encode(self, field: str, value) -> int:
+        import numpy as np
+        
+        lookup = self._lookup.get(field)
+        if lookup is None:
+            lookup = self._lookup[field] = {}
+            self._categories[field] = []
+            self._codes[field] = np.full(self._size, -1, dtype=np.int32)
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(self._categories[field])
+            self._categories[field].append(value)
+        return code
+    
+    def extend(self, metadatas):
+        metadatas = list(metadatas)
+        if not metadatas:
+            return
+        n = self._size + len(metadatas)
+        encoded = {}
+        for offset, metadata in enumerate(metadatas):
+            for field, value in metadata.items():
+                encoded.setdefault(field, []).append((offset, self._encode(field, value)))
+        
+        for field in self._codes:
+            codes = self._codes[field] = _reserve(self._codes[field], self._size, n)
+            codes[self._size:n] = -1
+            for offset, code in encoded.get(field, ()):
+                codes[self._size + offset] = code
+        self._size = n
+    
+    def append(self, metadata: Dict):
+        self.extend([metadata])
+    
+    def __setitem__(self, row: int, metadata: Dict):
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        codes = {field: self._encode(field, value) for field, value in metadata.items()}
+        for field in self._codes:
+            self._codes[field][row] = codes.get(field, -1)
+    
+    def take(self, rows) -> "MetadataColumns":
+        columns = MetadataColumns()
+        columns._categories = {field: list(values) for field, values in self._categories.items()}
+        columns._lookup = {field: dict(lookup) for field, lookup in self._lookup.items()}
+        columns._codes = {field: codes[:self._size][rows] for field, codes in self._codes.items()}
+        columns._size = len(next(iter(columns._codes.values()))) if columns._codes else 0
+        return columns
+    
+    def codes(self, field: str) -> "np.ndarray":
+        import numpy as np
+        codes = self._codes.get(field)
+        return codes[:self._size] if codes is not None else np.full(self._size, -1, dtype=np.int32)
+    
+    def code_of(self, field: str, value) -> int:
+        return self._lookup.get(field, {}).get(value, -1)
+    
+    def categories(self, field: str) -> List:
+        return list(self._categories.get(field, ()))
+    
+    def nbytes(self) -> int:
+        return sum(codes.nbytes for codes in self._codes.values())
+    
+    def to_arrays(self) -> Tuple[Dict[str, List], Dict[str, "np.ndarray"]]:
+        return dict(self._categories), {field: codes[:self._size] for field, codes in self._codes.items()}
+    
+    @classmethod
+    def from_arrays(cls, categories: Dict[str, List], codes: Dict[str, "np.ndarray"]) -> "MetadataColumns":
+        columns = cls()
+        columns._categories = {field: list(values) for field, values in categories.items()}
+        columns._lookup = {field: {value: code for code, value in enumerate(values)}
+                           for field, values in columns._categories.items()}
+        columns._codes = dict(codes)
+        columns._size = len(next(iter(codes.values()))) if codes else 0
+        return columns
+
+class IVFIndex:
+    """Inverted-file ANN index: spherical k-means ile n_lists kümeye bölünmüş L2-normalize vektörler
+    (NumPy dense veya SciPy sparse). Sorguda en yakın nprobe kümenin üyeleri tam skorlanır -
+    nprobe recall/gecikme ayarıdır (nprobe = n_lists tam aramaya eşittir)."""
+    
+    def __init__(self, n_lists: int = None, nprobe: int = 8, n_iter: int = 5,
+                 sample_size: int = 50_000, seed: int = 0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+        self.centroids = None
+        self.vectors = None
+        self._lists = []
+    
+    def fit(self, vectors) -> "IVFIndex":
+        import numpy as np
+        
+        n = vectors.shape[0]
+        n_lists = min(self.n_lists or max(1, int(2 * np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        
+        # Centroid'ler örneklem üzerinde eğitilir, sonra tüm vektörler atanır
+        sample = vectors[np.sort(rng.choice(n, min(n, max(self.sample_size, n_lists)), replace=False))]
+        centroids = _dense_rows(sample[rng.choice(sample.shape[0], n_lists, replace=False)])
+        for _ in range(self.n_iter):
+            assignment = _nearest_centroid(sample, centroids)
+            centroids = _update_centroids(sample, assignment, centroids)
+        
+        self.centroids = centroids
+        self.vectors = vectors
+        assignment = _nearest_centroid(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.cumsum(np.bincount(assignment, minlength=n_lists))[:-1]
+        self._lists = np.split(order, bounds)
+        return self
+    
+    def add(self, vectors, rows: "np.ndarray"):
+        """vectors: güncel tüm matris; rows: yeni eklenen satırlar - en yakın kümelere eklenir"""
+        import numpy as np
+        
+        self.vectors = vectors
+        assignment = _nearest_centroid(vectors[rows], self.centroids)
+        for list_id in np.unique(assignment):
+            self._lists[list_id] = np.concatenate([self._lists[list_id], rows[assignment == list_id]])
+    
+    def search(self, queries, k: int, nprobe: int = None) -> List[Tuple["np.ndarray", "np.ndarray"]]:
+        """Sorgu başına (satır indeksleri, cosine skorları) - azalan skor sırasında"""
+        import numpy as np
+        
+        probe_scores = queries @ self.centroids.T
+        probes = _top_k_indices(np.asarray(probe_scores), nprobe or self.nprobe)
+        
+        results = []
+        for i, probe in enumerate(probes):
+            candidates = np.concatenate([self._lists[list_id] for list_id in probe])
+            scores = _dense_rows(self.vectors[candidates] @ queries[i].T).ravel()
+            top = _top_k_indices(scores, k)
+            results.append((candidates[top], scores[top]))
+        return results
+
+def _dense_rows(matrix) -> "np.ndarray":
+    import numpy as np
+    return np.asarray(matrix.toarray() if hasattr(matrix, 'toarray') else matrix, dtype=np.float32)
+
+def _nearest_centroid(vectors, centroids: "np.ndarray") -> "np.ndarray":
+    # Atama skor matrisi SCORE_BLOCK_SIZE hücrelik bloklar halinde hesaplanır
+    import numpy as np
+    
+    chunk_size = max(1, SCORE_BLOCK_SIZE // len(centroids))
+    return np.concatenate([
+        np.asarray(vectors[start:start + chunk_size] @ centroids.T).argmax(axis=1)
+        for start in range(0, vectors.shape[0], chunk_size)
+    ])
+
+def _update_centroids(vectors, assignment: "np.ndarray", centroids: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+    from scipy import sparse
+    
+    n_lists = len(centroids)
+    members = sparse.csr_matrix(
+        (np.ones(len(assignment), dtype=np.float32), (assignment, np.arange(len(assignment)))),
+        shape=(n_lists, vectors.shape[0])
+    )
+    sums = _dense_rows(members @ vectors)
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    # Boş kalan kümeler eski centroid'ini korur
+    return np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+
 class VectorStore:
-    def __init__(self):
+    COLLECTION_NAME = "prompt_examples"
+    # Chroma mesafeleri TF-IDF yoluyla aynı ölçekte olsun: 1 - cosine similarity
+    COLLECTION_METADATA = {"hnsw:space": "cosine"}
+    
+    def __init__(self, refit_threshold: float = 0.2, persist_dir: str = None, ann_nprobe: int = None,
+                 embedder: Embedder = None, search_mode: str = 'cascade', hybrid_budget_ms: float = 50.0):
+        """ann_nprobe verilirse büyük korpuslarda (>= ANN_MIN_DOCS) filtresiz TF-IDF araması IVF ANN
+        index'i ile yapılır; daha büyük nprobe = daha yüksek recall, daha yavaş sorgu.
+        embedder: Chroma vektörlerini üreten yerel model (varsayılan HashingEmbedder); kalıcı modda
+        embedding'ler persist_dir altında diskte cache'lenir.
+        search_mode: 'cascade' veya 'hybrid' (Chroma + TF-IDF RRF, hybrid_budget_ms gecikme bütçesiyle)."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
         self.vectorizer = TfidfVectorizer(max_features=5000)
-        self.documents = []
-        self.metadatas = []
+        # Kolonlu depolama: dokümanlar tek UTF-8 buffer, metadata kategorik kodlar (satır başına nesne yok)
+        self.documents = TextColumn()
+        self.metadatas = MetadataColumns()
+        self.ids = []
+        self._id_to_row = {}
+        # L2-normalize edilmiş CSR doküman matrisi - add_prompts'ta bir kez kurulur
+        self.doc_matrix = None
+        # Analyzer skorları için IDF istatistikleri - her fit/yüklemede yeniden kurulur
+        self.corpus_stats = None
+        # Metadata filtresi -> (satır indeksleri, alt TF-IDF matrisi); korpus değişince temizlenir
+        self._partitions = OrderedDict()
+        # IVF ANN index'i ilk aramada kurulur; yeni satırlar eklenir, silme/refit'te atılır
+        self.ann_nprobe = ann_nprobe
+        self._ann = None
+        # Paylaşılan index (load_index, worker pool thread'leri): refit, upsert/delete, bölüm cache'i, ANN
+        # kurulumu ve TF-IDF araması bu kilit altında - kimse yarım kurulmuş matris / bölüm görmez.
+        # Chroma sorgusu kilit dışında; sadece sonucun yerel kolonlarla eşlenmesi kilitli.
+        self._lock = threading.RLock()
+        
+        # Hybrid arama: kaynaklar paylaşılan küçük thread pool'da paralel, bütçeyi aşan düşürülür
+        self.search_mode = search_mode
+        self.hybrid_budget_ms = hybrid_budget_ms
+        self._executor = None
+        self._hybrid_lock = threading.Lock()
+        self._hybrid_counters = dict.fromkeys(
+            ('fused', 'dense_only', 'sparse_only', 'none', 'dropped_dense', 'dropped_sparse'), 0
+        )
+        
+        # Yakalanan index / arama hataları: işlem -> sayı (error_stats); arama sırasındakiler sonuca
+        # 'errors' olarak da yazılır, pipeline isteğin metriğine ekler
+        self._error_lock = threading.Lock()
+        self._error_counts = {}
+        
+        # Vocabulary drift: son fit'ten beri değişen satır oranı eşiği aşınca lazy refit
+        self.refit_threshold = refit_threshold
+        self._fit_size = 0
+        self._drift = 0
+        self._needs_refit = False
+        
+        # Kalıcı mod: Chroma PersistentClient + diskte TF-IDF index (dataset hash ile anahtarlı)
+        self.persist_dir = persist_dir
+        
+        # Embedding'ler açıkça hesaplanıp Chroma'ya verilir (Chroma'nın varsayılan modeli kullanılmaz)
+        if embedder is None or not isinstance(embedder, CachedEmbedder):
+            embedder = CachedEmbedder(
+                embedder or HashingEmbedder(),
+                cache_path=os.path.join(persist_dir, "embeddings.sqlite") if persist_dir else None
+            )
+        self.embedder = embedder
+        self._chroma_warned = False
         
         try:
-            self.client = chromadb.EphemeralClient()
-            self.collection = self.client.create_collection("prompt_examples")
-        except:
+            import chromadb
+            if persist_dir:
+                self.client = chromadb.PersistentClient(path=os.path.join(persist_dir, "chroma"))
+                self.collection_name = self.COLLECTION_NAME
+            else:
+                # Ephemeral client süreç içinde paylaşılır - her store kendi koleksiyonunu kullanır
+                self.client = chromadb.EphemeralClient()
+                self.collection_name = f"{self.COLLECTION_NAME}_{os.urandom(4).hex()}"
+            self.collection = self.client.get_or_create_collection(
+                self.collection_name, metadata=self.COLLECTION_METADATA, embedding_function=None
+            )
+        except Exception as e:
+            print(f"⚠️ ChromaDB kullanılamıyor, sadece TF-IDF: {e}")
             self.collection = None
     
     def add_prompts(self, prompts_data):
-        self.documents = []
-        self.metadatas = []
-        ids = []
-        
-        for i, prompt_info in enumerate(prompts_data):
-            self.documents.append(prompt_info['prompt'])
-            self.metadatas.append({
-                'act': prompt_info.get('act', 'general'),
-                'type': prompt_info.get('type', 'general')
-            })
-            ids.append(str(i))
+        """Tüm korpusu değiştirir: eski kayıtları siler, vocabulary'yi baştan fit eder.
+        Kalıcı modda dataset hash'i diskteki index ile aynıysa hiçbir şey yeniden hesaplanmaz."""
+        rows = self._to_rows(prompts_data)
+        self._replace_corpus([rows], self._dataset_hash(rows) if self.persist_dir else None)
+    
+    def add_prompt_chunks(self, chunks, dataset_hash: str = None):
+        """add_prompts'un parça parça hali - korpusu chunk'lar halinde (liste listesi / generator) değiştirir.
+        dataset_hash kalıcı modda kaynağın parmak izidir: diskteki index ile aynıysa chunk'lar hiç okunmaz."""
+        self._replace_corpus((self._to_rows(chunk) for chunk in chunks), dataset_hash)
+    
+    def _replace_corpus(self, row_chunks, dataset_hash: str = None):
+        with self._lock:
+            if self.persist_dir:
+                if dataset_hash is not None and self._load_index(dataset_hash):
+                    return
+                self._chroma_reset()
+            elif self.ids:
+                self._chroma_delete(self.ids)
+            
+            self.documents = TextColumn()
+            self.metadatas = MetadataColumns()
+            self.ids = []
+            self._id_to_row = {}
+            self.doc_matrix = None
+            
+            for rows in row_chunks:
+                self._upsert_rows(rows)
+            self._refit()
+            
+            if self.persist_dir:
+                self.save(dataset_hash)
+    
+    def upsert_prompts(self, prompts_data) -> List[str]:
+        """Yeni prompt'ları ekler, aynı id'li olanları günceller - sadece değişen satırlar işlenir"""
+        return self._upsert_rows(self._to_rows(prompts_data))
+    
+    def _upsert_rows(self, rows: Dict[str, Tuple[str, Dict]]) -> List[str]:
+        with self._lock:
+            new_docs, new_metadatas = [], []
+            changed_rows, changed_docs = [], []
+            
+            for prompt_id, (document, metadata) in rows.items():
+                row = self._id_to_row.get(prompt_id)
+                if row is None:
+                    self._id_to_row[prompt_id] = len(self.ids)
+                    self.ids.append(prompt_id)
+                    new_docs.append(document)
+                    new_metadatas.append(metadata)
+                else:
+                    if self.documents[row] != document:
+                        changed_rows.append(row)
+                        changed_docs.append(document)
+                        self.documents[row] = document
+                    self.metadatas[row] = metadata
+            
+            # Yeni satırlar kolonlara tek seferde eklenir
+            self.documents.extend(new_docs)
+            self.metadatas.extend(new_metadatas)
+            
+            if rows:
+                self._chroma_upsert(list(rows.keys()))
+            
+            if self.doc_matrix is not None and not self._needs_refit:
+                from scipy import sparse
+                try:
+                    if new_docs:
+                        self.doc_matrix = sparse.vstack(
+                            [self.doc_matrix, self._encode(new_docs)], format='csr'
+                        )
+                    if changed_rows:
+                        self._replace_rows(changed_rows, changed_docs)
+                    if self._ann is not None:
+                        # Yeni satırlar en yakın kümelere eklenir; değişen satırlar eski kümesinde kalır
+                        # (yaklaşık) ama skorları güncel matristen hesaplanır
+                        self._ann.vectors = self.doc_matrix
+                        if new_docs:
+                            import numpy as np
+                            self._ann.add(self.doc_matrix, np.arange(len(self.ids) - len(new_docs), len(self.ids)))
+                except ValueError as e:
+                    print(f"⚠️ Artımlı index güncellemesi başarısız, refit yapılacak: {e}")
+                    self._count_error('incremental_update')
+                    self._needs_refit = True
+            
+            self._partitions.clear()
+            self._register_drift(len(new_docs) + len(changed_rows))
+            self._invalidate_saved_index()
+            return list(rows.keys())
+    
+    def update_prompts(self, prompts_data) -> List[str]:
+        """Var olan id'lerin içeriğini günceller; bilinmeyen id'ler atlanır (eklemek için upsert_prompts)"""
+        with self._lock:
+            known = [p for p in prompts_data if str(p.get('id', '')) in self._id_to_row]
+            if not known:
+                return []
+            return self.upsert_prompts(known)
+    
+    def delete_prompts(self, ids: List[str]) -> List[str]:
+        """Verilen id'leri Chroma'dan ve TF-IDF matrisinden siler"""
+        with self._lock:
+            deleted = [prompt_id for prompt_id in dict.fromkeys(ids) if prompt_id in self._id_to_row]
+            if not deleted:
+                return []
+            
+            self._chroma_delete(deleted)
+            
+            import numpy as np
+            keep = np.ones(len(self.ids), dtype=bool)
+            keep[[self._id_to_row[prompt_id] for prompt_id in deleted]] = False
+            
+            # Matris adımı kolonlardan önce: refit bekleyen (upsert'lerin artık güncellemediği) matrisin satır
+            # sayısı id'lerle tutmayabilir - o zaman indekslenmez, bir sonraki aramadaki lazy refit'e bırakılır
+            doc_matrix = self.doc_matrix
+            if doc_matrix is not None:
+                if self._needs_refit or doc_matrix.shape[0] != len(self.ids):
+                    doc_matrix = None
+                else:
+                    doc_matrix = doc_matrix[keep]
+            
+            self.ids = [pid for pid, k in zip(self.ids, keep) if k]
+            self.documents = self.documents.take(keep)
+            self.metadatas = self.metadatas.take(keep)
+            self._id_to_row = {pid: row for row, pid in enumerate(self.ids)}
+            self.doc_matrix = doc_matrix
+            self._ann = None
+            
+            self._partitions.clear()
+            self._register_drift(len(deleted))
+            self._invalidate_saved_index()
+            return deleted
+    
+    def _to_rows(self, prompts_data) -> Dict[str, Tuple[str, Dict]]:
+        rows = {}
+        for prompt_info in prompts_data:
+            rows[_prompt_id(prompt_info)] = (
+                prompt_info['prompt'],
+                {
+                    'act': prompt_info.get('act', 'general'),
+                    'type': prompt_info.get('type', 'general'),
+                    'language': prompt_info.get('language') or _detect_language(prompt_info['prompt'])
+                }
+            )
+        return rows
+    
+    def _encode(self, documents: List[str]):
+        from sklearn.preprocessing import normalize
+        return normalize(self.vectorizer.transform(documents), norm='l2', copy=False).tocsr()
+    
+    def _replace_rows(self, rows: List[int], documents: List[str]):
+        # Değişen satırları sona ekle, sonra satır sırasını düzelt (yeniden tokenize etmeden)
+        import numpy as np
+        from scipy import sparse
         
+        n_rows = self.doc_matrix.shape[0]
+        stacked = sparse.vstack([self.doc_matrix, self._encode(documents)], format='csr')
+        order = np.arange(n_rows)
+        order[rows] = n_rows + np.arange(len(rows))
+        self.doc_matrix = stacked[order]
+    
+    def _register_drift(self, n_changed: int):
+        self._drift += n_changed
+        if self.doc_matrix is None or self._drift > self.refit_threshold * max(self._fit_size, 1):
+            self._needs_refit = True
+    
+    def _refit(self):
+        with self._lock:
+            # Matris ve istatistikler önce yerelde kurulur, sonra atanır - kilitsiz okuyan (analyzer'ın
+            # corpus_stats'ı) None ya da yarım kurulmuş durum görmez
+            doc_matrix, corpus_stats = None, None
+            if self.documents:
+                from sklearn.preprocessing import normalize
+                try:
+                    doc_matrix = normalize(self.vectorizer.fit_transform(self.documents), norm='l2', copy=False).tocsr()
+                    corpus_stats = CorpusStats.from_vectorizer(self.vectorizer)
+                except Exception as e:
+                    print(f"⚠️ TF-IDF index kurulamadı: {e}")
+                    self._count_error('refit')
+                    doc_matrix, corpus_stats = None, None
+            self.doc_matrix = doc_matrix
+            self.corpus_stats = corpus_stats
+            self._partitions.clear()
+            self._ann = None
+            self._fit_size = len(self.documents)
+            self._drift = 0
+            self._needs_refit = False
+            self._build_partitions()
+    
+    # ---------- Kalıcı index ----------
+    def _index_dir(self) -> str:
+        return os.path.join(self.persist_dir, "tfidf")
+    
+    def _dataset_hash(self, rows: Dict[str, Tuple[str, Dict]]) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps({
+            'format': INDEX_FORMAT_VERSION,
+            'max_features': self.vectorizer.max_features,
+            'embedder': self.embedder.name
+        }, sort_keys=True).encode('utf-8'))
+        digest.update(json.dumps(
+            [[prompt_id, document, metadata] for prompt_id, (document, metadata) in rows.items()],
+            sort_keys=True, ensure_ascii=False
+        ).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def save(self, dataset_hash: str = None):
+        """TF-IDF vocabulary, idf ve doküman matrisini diske yazar (manifest en son yazılır)"""
+        with self._lock:
+            if not self.persist_dir:
+                return
+            if self._needs_refit:
+                self._refit()
+            if self.doc_matrix is None:
+                return
+            
+            if dataset_hash is None:
+                dataset_hash = self._dataset_hash({
+                    prompt_id: (document, metadata)
+                    for prompt_id, document, metadata in zip(self.ids, self.documents, self.metadatas)
+                })
+            
+            import numpy as np
+            
+            index_dir = self._index_dir()
+            os.makedirs(index_dir, exist_ok=True)
+            self._invalidate_saved_index()
+            
+            # Doküman/metadata kolonları ham dizi olarak yazılır - yüklemede memory-map edilir
+            for name, array in self.documents.to_arrays().items():
+                np.save(os.path.join(index_dir, f"text_{name}.npy"), array)
+            categories, codes = self.metadatas.to_arrays()
+            fields = list(codes)
+            np.save(os.path.join(index_dir, "metadata_codes.npy"),
+                    np.stack([codes[field] for field in fields]) if fields
+                    else np.empty((0, len(self.ids)), dtype=np.int32))
+            
+            with open(os.path.join(index_dir, "rows.json"), "w", encoding="utf-8") as f:
+                # json.dumps C encoder'ı kullanır; json.dump(f) satır satır Python'da yazar
+                f.write(json.dumps({'ids': self.ids, 'metadata_fields': fields, 'categories': categories},
+                                   ensure_ascii=False))
+            with open(os.path.join(index_dir, "vocabulary.json"), "w", encoding="utf-8") as f:
+                f.write(json.dumps({term: int(col) for term, col in self.vectorizer.vocabulary_.items()},
+                                   ensure_ascii=False))
+            np.save(os.path.join(index_dir, "idf.npy"), self.vectorizer.idf_)
+            
+            doc_matrix = self.doc_matrix.tocsr()
+            np.save(os.path.join(index_dir, "data.npy"), doc_matrix.data)
+            np.save(os.path.join(index_dir, "indices.npy"), doc_matrix.indices)
+            np.save(os.path.join(index_dir, "indptr.npy"), doc_matrix.indptr)
+            
+            with open(os.path.join(index_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    'dataset_hash': dataset_hash,
+                    'format': INDEX_FORMAT_VERSION,
+                    'shape': list(doc_matrix.shape),
+                    'fit_size': self._fit_size
+                }, f)
+    
+    def _load_index(self, dataset_hash: str) -> bool:
+        """Manifest hash'i eşleşirse index'i yükler; doküman matrisi memory-map ile açılır"""
+        with self._lock:
+            import numpy as np
+            from scipy import sparse
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            
+            index_dir = self._index_dir()
+            try:
+                with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get('dataset_hash') != dataset_hash or manifest.get('format') != INDEX_FORMAT_VERSION:
+                    return False
+                
+                with open(os.path.join(index_dir, "rows.json"), encoding="utf-8") as f:
+                    rows = json.load(f)
+                with open(os.path.join(index_dir, "vocabulary.json"), encoding="utf-8") as f:
+                    vocabulary = json.load(f)
+                
+                vectorizer = TfidfVectorizer(max_features=self.vectorizer.max_features)
+                vectorizer.vocabulary_ = vocabulary
+                vectorizer.idf_ = np.load(os.path.join(index_dir, "idf.npy"))
+                
+                documents = TextColumn.from_arrays(*(
+                    np.load(os.path.join(index_dir, f"text_{name}.npy"), mmap_mode='r')
+                    for name in ('buffer', 'starts', 'ends')
+                ))
+                codes = np.load(os.path.join(index_dir, "metadata_codes.npy"))
+                metadatas = MetadataColumns.from_arrays(
+                    rows['categories'], {field: codes[i] for i, field in enumerate(rows['metadata_fields'])}
+                )
+                
+                doc_matrix = sparse.csr_matrix((
+                    np.load(os.path.join(index_dir, "data.npy"), mmap_mode='r'),
+                    np.load(os.path.join(index_dir, "indices.npy"), mmap_mode='r'),
+                    np.load(os.path.join(index_dir, "indptr.npy"), mmap_mode='r')
+                ), shape=tuple(manifest['shape']), copy=False)
+            except FileNotFoundError:
+                # Kayıtlı index yok (ilk açılış / geçersiz kılınmış) - normal akış
+                return False
+            except Exception as e:
+                print(f"⚠️ Kayıtlı index okunamadı, yeniden kuruluyor: {e!r}")
+                self._count_error('index_load')
+                return False
+            
+            self.vectorizer = vectorizer
+            self.doc_matrix = doc_matrix
+            self.corpus_stats = CorpusStats.from_vectorizer(vectorizer)
+            self._partitions.clear()
+            self._ann = None
+            self.ids = rows['ids']
+            self.documents = documents
+            self.metadatas = metadatas
+            self._id_to_row = {prompt_id: row for row, prompt_id in enumerate(self.ids)}
+            self._fit_size = manifest.get('fit_size', len(self.ids))
+            self._drift = 0
+            self._needs_refit = False
+            self._build_partitions()
+            return True
+    
+    def _invalidate_saved_index(self):
+        # Diskteki index artık bellekteki durumla aynı değil - bir sonraki açılışta rebuild
+        if self.persist_dir:
+            try:
+                os.remove(os.path.join(self._index_dir(), "manifest.json"))
+            except OSError:
+                pass
+    
+    def _chroma_reset(self):
         try:
             if self.collection:
-                self.collection.add(
-                    documents=self.documents,
-                    metadatas=self.metadatas,
-                    ids=ids
+                self.client.delete_collection(self.collection_name)
+                self.collection = self.client.create_collection(
+                    self.collection_name, metadata=self.COLLECTION_METADATA, embedding_function=None
                 )
-        except:
-            pass
+        except Exception as e:
+            self._chroma_failed("reset", e)
+            self.collection = None
+    
+    def _chroma_upsert(self, ids: List[str]):
+        try:
+            if self.collection:
+                rows = [self._id_to_row[prompt_id] for prompt_id in ids]
+                # Doküman metni Chroma'da tutulmaz (TextColumn'da zaten var) - sadece vektör + metadata
+                for start in range(0, len(rows), EMBEDDING_BATCH_SIZE * 4):
+                    part = rows[start:start + EMBEDDING_BATCH_SIZE * 4]
+                    self.collection.upsert(
+                        ids=ids[start:start + len(part)],
+                        embeddings=self.embedder.embed([self.documents[row] for row in part]),
+                        metadatas=[self.metadatas[row] for row in part]
+                    )
+        except Exception as e:
+            self._chroma_failed("upsert", e)
+    
+    def _chroma_delete(self, ids: List[str]):
+        try:
+            if self.collection:
+                self.collection.delete(ids=ids)
+        except Exception as e:
+            self._chroma_failed("delete", e)
+    
+    def _chroma_failed(self, operation: str, error: Exception, errors: List[str] = None):
+        # Sessizce TF-IDF'e düşmek yerine ilk hatada uyar; her hata sayılır
+        self._count_error(f"chroma_{operation}", errors)
+        if not self._chroma_warned:
+            self._chroma_warned = True
+            print(f"⚠️ ChromaDB {operation} hatası, TF-IDF kullanılıyor: {error!r}")
+    
+    def _count_error(self, operation: str, errors: List[str] = None):
+        with self._error_lock:
+            self._error_counts[operation] = self._error_counts.get(operation, 0) + 1
+        if errors is not None:
+            errors.append(operation)
+    
+    def error_stats(self) -> Dict:
+        """İşlem başına yakalanan hatalar (chroma_query, tfidf_search, index_load, refit, ...)"""
+        with self._error_lock:
+            return dict(self._error_counts)
+    
+    # ---------- Metadata bölümleri ----------
+    def _build_partitions(self):
+        """PARTITION_FIELDS'taki her değer için bölüm (satırlar + alt matris) index zamanında hazırlanır"""
+        if self.doc_matrix is None:
+            return
+        for field in PARTITION_FIELDS:
+            for value in self.metadatas.categories(field):
+                self._partition(((field, (value,)),))
+    
+    def _partition(self, filters: Tuple):
+        """Filtreye uyan satırlar ve sadece o satırların TF-IDF matrisi (LRU cache'li)"""
+        with self._lock:
+            import numpy as np
+            
+            partition = self._partitions.get(filters)
+            if partition is not None:
+                self._partitions.move_to_end(filters)
+                return partition
+            
+            mask = np.ones(len(self.ids), dtype=bool)
+            for field, values in filters:
+                codes = [self.metadatas.code_of(field, value) for value in values]
+                mask &= np.isin(self.metadatas.codes(field), [code for code in codes if code >= 0])
+            rows = np.flatnonzero(mask)
+            partition = self._partitions[filters] = (rows, self.doc_matrix[rows])
+            while len(self._partitions) > PARTITION_CACHE_SIZE:
+                self._partitions.popitem(last=False)
+            return partition
+    
+    def _ann_index(self) -> IVFIndex:
+        with self._lock:
+            if self.ann_nprobe is None or self.doc_matrix is None or self.doc_matrix.shape[0] < ANN_MIN_DOCS:
+                return None
+            if self._ann is None:
+                self._ann = IVFIndex(nprobe=self.ann_nprobe).fit(self.doc_matrix)
+            return self._ann
+    
+    def search_similar_prompts(self, query: str, n_results: int = 3, where: Dict = None, mode: str = None):
+        return self.search_similar_prompts_batch([query], n_results, where, mode)
+    
+    def search_similar_prompts_batch(self, queries: List[str], n_results: int = 3, where: Dict = None,
+                                     mode: str = None):
+        """Çoklu sorgu: tek Chroma query / tek sparse matris çarpımı, sonuçlar sorgu sırasında.
+        where: metadata filtresi, ör. {'type': 'coding', 'language': ['tr', 'en']} - sadece eşleşen
+        satırlar skorlanır (Chroma'da `where`, TF-IDF'te önceden hazırlanmış bölüm matrisi).
+        mode: 'cascade' (Chroma, hata olursa TF-IDF) veya 'hybrid' (ikisi paralel, RRF ile birleştirilir;
+        hybrid sonuçta 'scores' kaynak başına benzerlikleri ve rrf skorunu içerir). Varsayılan search_mode.
+        Sonuçtaki 'source' cevabı veren kaynaktır: 'chroma', 'tfidf', 'ann', 'hybrid' veya 'none';
+        arama sırasında bir kaynak hata verdiyse 'errors' başarısız işlemleri listeler."""
+        queries = list(queries)
+        if not queries:
+            return {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        filters = _normalize_where(where)
+        errors = []
         
-        if self.documents:
-            try:
-                self.vectorizer.fit(self.documents)
-            except:
-                pass
+        if (mode or self.search_mode) == 'hybrid':
+            results = self._hybrid_search(queries, n_results, filters, errors)
+        else:
+            results = self._dense_search(queries, n_results, filters, errors)
+            if results is None:
+                results = self._sparse_search(queries, n_results, filters, errors)
+        
+        if results is None:
+            results = {
+                'ids': [[] for _ in queries],
+                'documents': [[] for _ in queries],
+                'metadatas': [[] for _ in queries],
+                'distances': [[] for _ in queries],
+                'source': 'none'
+            }
+        if errors:
+            results['errors'] = errors
+        return results
     
-    def search_similar_prompts(self, query: str, n_results: int = 3):
+    def _dense_search(self, queries: List[str], n_results: int, filters: Tuple, errors: List[str] = None) -> Dict:
+        """Chroma araması (yerel embedding'lerle); kullanılamıyorsa None"""
         try:
             if self.collection and self.documents:
                 results = self.collection.query(
-                    query_texts=[query],
-                    n_results=min(n_results, len(self.documents))
+                    query_embeddings=self.embedder.embed_queries(queries),
+                    n_results=min(n_results, len(self.documents)),
+                    include=['metadatas', 'distances'],
+                    **({'where': _chroma_where(filters)} if filters else {})
                 )
-                return results
-        except:
-            pass
+                # Dokümanlar yerel kolondan; Chroma'da olup yerelde olmayan id'ler atlanır
+                merged = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'source': 'chroma'}
+                with self._lock:
+                    for ids, metadatas, distances in zip(results['ids'], results['metadatas'], results['distances']):
+                        kept = [hit for hit in zip(ids, metadatas, distances) if hit[0] in self._id_to_row]
+                        merged['ids'].append([prompt_id for prompt_id, _, _ in kept])
+                        merged['documents'].append(
+                            [self.documents[self._id_to_row[prompt_id]] for prompt_id, _, _ in kept]
+                        )
+                        merged['metadatas'].append([metadata for _, metadata, _ in kept])
+                        merged['distances'].append([distance for _, _, distance in kept])
+                return merged
+        except Exception as e:
+            self._chroma_failed("query", e, errors)
+        return None
+    
+    def _sparse_search(self, queries: List[str], n_results: int, filters: Tuple, errors: List[str] = None) -> Dict:
+        """TF-IDF araması (büyük korpusta opsiyonel IVF ANN); kullanılamıyorsa None"""
+        with self._lock:
+            try:
+                if self._needs_refit:
+                    self._refit()
+                if self.documents and self.doc_matrix is not None:
+                    query_matrix = self._encode(queries)
+                    results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'source': 'tfidf'}
+                    
+                    ann = None if filters else self._ann_index()
+                    if ann is not None:
+                        results['source'] = 'ann'
+                        for corpus_rows, scores in ann.search(query_matrix, n_results):
+                            results['ids'].append([self.ids[i] for i in corpus_rows])
+                            results['documents'].append([self.documents[i] for i in corpus_rows])
+                            results['metadatas'].append([self.metadatas[i] for i in corpus_rows])
+                            results['distances'].append([1 - score for score in scores])
+                        return results
+                    
+                    rows, doc_matrix = self._partition(filters) if filters else (None, self.doc_matrix)
+                    
+                    # Yoğun skor bloğunu sınırlı tut: chunk başına ~SCORE_BLOCK_SIZE hücre
+                    chunk_size = max(1, SCORE_BLOCK_SIZE // max(doc_matrix.shape[0], 1))
+                    for start in range(0, len(queries), chunk_size):
+                        # Normalize vektörlerde cosine similarity = sparse matris çarpımı
+                        similarities = (query_matrix[start:start + chunk_size] @ doc_matrix.T).toarray()
+                        top_indices = _top_k_indices(similarities, n_results)
+                        
+                        for row_scores, row_indices in zip(similarities, top_indices):
+                            # Bölüm içi indeks -> korpus satırı
+                            corpus_rows = rows[row_indices] if rows is not None else row_indices
+                            results['ids'].append([self.ids[i] for i in corpus_rows])
+                            results['documents'].append([self.documents[i] for i in corpus_rows])
+                            results['metadatas'].append([self.metadatas[i] for i in corpus_rows])
+                            results['distances'].append([1 - row_scores[i] for i in row_indices])
+                    return results
+            except Exception as e:
+                print(f"⚠️ TF-IDF arama hatası: {e}")
+                self._count_error('tfidf_search', errors)
+            return None
+    
+    # ---------- Hybrid arama ----------
+    def _hybrid_search(self, queries: List[str], n_results: int, filters: Tuple, errors: List[str] = None) -> Dict:
+        """Dense ve sparse arama paralel çalışır; bütçe (hybrid_budget_ms) içinde biten kaynaklar RRF ile
+        birleştirilir. Hiçbiri bitmediyse ilk biten beklenir - yavaş kaynak cevabı bekletmez."""
+        from concurrent.futures import FIRST_COMPLETED, wait
         
-        # TF-IDF fallback
-        try:
-            if self.documents and hasattr(self.vectorizer, 'vocabulary_'):
-                query_vec = self.vectorizer.transform([query])
-                doc_vecs = self.vectorizer.transform(self.documents)
-                similarities = cosine_similarity(query_vec, doc_vecs).flatten()
-                
-                top_indices = similarities.argsort()[-n_results:][::-1]
-                return {
-                    'documents': [[self.documents[i] for i in top_indices]],
-                    'metadatas': [[self.metadatas[i] for i in top_indices]],
-                    'distances': [[1 - similarities[i] for i in top_indices]]
-                }
-        except:
-            pass
+        depth = n_results * HYBRID_CANDIDATE_FACTOR
+        executor = self._search_executor()
+        futures = {
+            executor.submit(self._dense_search, queries, depth, filters, errors): 'dense',
+            executor.submit(self._sparse_search, queries, depth, filters, errors): 'sparse',
+        }
+        done, pending = wait(futures, timeout=self.hybrid_budget_ms / 1000)
+        if not done:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        
+        source_results = {}
+        for future in done:
+            results = future.result()
+            if results is not None:
+                source_results[futures[future]] = results
+        
+        with self._hybrid_lock:
+            for future in pending:
+                self._hybrid_counters['dropped_' + futures[future]] += 1
+            outcome = 'fused' if len(source_results) == 2 else next(iter(source_results), 'none') + ('_only' if source_results else '')
+            self._hybrid_counters[outcome] += 1
+        
+        if not source_results:
+            return None
+        return _fuse_rrf(source_results, len(queries), n_results)
+    
+    def _search_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            with self._hybrid_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="promptlab-search")
+        return self._executor
+    
+    def hybrid_stats(self) -> Dict:
+        """Hybrid aramada kaynakların kaç kez birleştirildiği / bütçe aşımıyla düşürüldüğü"""
+        with self._hybrid_lock:
+            return dict(self._hybrid_counters)
+
+def _fuse_rrf(source_results: Dict[str, Dict], n_queries: int, n_results: int) -> Dict:
+    """Reciprocal-rank fusion: skor = sum(1 / (HYBRID_RRF_K + sıra)). Mesafe, kaynaklardaki en küçük mesafe."""
+    fused = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'scores': [],
+             'source': 'hybrid' if len(source_results) > 1 else next(iter(source_results.values()))['source']}
+    for query in range(n_queries):
+        entries = {}
+        for source, results in source_results.items():
+            hits = zip(results['ids'][query], results['documents'][query],
+                       results['metadatas'][query], results['distances'][query])
+            for rank, (prompt_id, document, metadata, distance) in enumerate(hits, start=1):
+                entry = entries.get(prompt_id)
+                if entry is None:
+                    entry = entries[prompt_id] = {'document': document, 'metadata': metadata,
+                                                  'distance': float(distance), 'scores': {'rrf': 0.0}}
+                entry['scores']['rrf'] += 1.0 / (HYBRID_RRF_K + rank)
+                entry['scores'][source] = 1.0 - float(distance)
+                entry['distance'] = min(entry['distance'], float(distance))
         
-        return {'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        top = sorted(entries.items(), key=lambda item: -item[1]['scores']['rrf'])[:n_results]
+        fused['ids'].append([prompt_id for prompt_id, _ in top])
+        fused['documents'].append([entry['document'] for _, entry in top])
+        fused['metadatas'].append([entry['metadata'] for _, entry in top])
+        fused['distances'].append([entry['distance'] for _, entry in top])
+        fused['scores'].append([entry['scores'] for _, entry in top])
+    return fused
 
-# ==================== GEMINI RAG AGENT ====================
-class GeminiRAGAgent:
-    def __init__(self, api_key: str = None):
+# ==================== DATASET LOADER ====================
+# Toplu yüklemede bir seferde bellekte tutulan satır sayısı
+DATASET_CHUNK_SIZE = 10_000
+DATASET_FORMATS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv', '.parquet': 'parquet'}
+
+def _dataset_format(path: str) -> str:
+    fmt = DATASET_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Desteklenmeyen dataset formatı: {path} (jsonl, csv, parquet)")
+    return fmt
+
+def _iter_raw_records(path: str, fmt: str, chunk_size: int):
+    """Kaynak dosyadan ham kayıt listeleri (chunk_size'lık) - dosya hiçbir zaman tamamen okunmaz.
+    Bozuk JSON satırları None olarak gelir (validasyonda sayılır)."""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in ('id', 'act', 'prompt', 'type', 'language') if name in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pylist()
+        return
+    
+    import csv
+    with open(path, encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            records = csv.DictReader(f)
+        else:
+            records = (_parse_json_line(line) for line in f if line.strip())
+        
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def _parse_json_line(line: str):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _validate_record(record) -> Dict:
+    """(act, prompt, type[, language]) şeması - prompt zorunlu, act/type boşsa 'general'; geçersizse None"""
+    if not isinstance(record, dict):
+        return None
+    prompt = record.get('prompt')
+    if not isinstance(prompt, str) or not prompt.strip():
+        return None
+    
+    valid = {'prompt': prompt.strip()}
+    for field in ('act', 'type'):
+        value = record.get(field)
+        valid[field] = value.strip() if isinstance(value, str) and value.strip() else 'general'
+    if isinstance(record.get('language'), str) and record['language'].strip():
+        valid['language'] = record['language'].strip()
+    if record.get('id') not in (None, ''):
+        valid['id'] = str(record['id'])
+    return valid
+
+def _dataset_fingerprint(path: str, store: "VectorStore") -> str:
+    """Kaynak dosyanın parmak izi (yol, boyut, mtime) - içerik okunmadan kalıcı index eşleştirmesi"""
+    stat = os.stat(path)
+    return hashlib.sha256(json.dumps({
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'format': INDEX_FORMAT_VERSION,
+        'max_features': store.vectorizer.max_features,
+        'embedder': store.embedder.name
+    }, sort_keys=True).encode('utf-8')).hexdigest()
+
+def iter_dataset_chunks(path: str, chunk_size: int = DATASET_CHUNK_SIZE, stats: Dict = None, progress=None):
+    """JSONL/CSV/Parquet dosyasını doğrulanmış, içerik hash'ine göre tekilleştirilmiş chunk'lar halinde akıtır.
+    stats verilirse sayaçlar (rows_read, rows_indexed, duplicates, invalid, chunks) yerinde güncellenir;
+    progress(stats) her chunk sonrası çağrılır."""
+    fmt = _dataset_format(path)
+    stats = stats if stats is not None else {}
+    for counter in ('rows_read', 'rows_indexed', 'duplicates', 'invalid', 'chunks'):
+        stats.setdefault(counter, 0)
+    # Tekilleştirme için içerik hash'inin ilk 8 byte'ı (int) - satır başına ~sabit bellek
+    seen = set()
+    started = time.perf_counter()
+    
+    for raw_chunk in _iter_raw_records(path, fmt, chunk_size):
+        chunk = []
+        for record in raw_chunk:
+            record = _validate_record(record)
+            if record is None:
+                stats['invalid'] += 1
+                continue
+            content_hash = int.from_bytes(hashlib.sha1(record['prompt'].encode('utf-8')).digest()[:8], 'big')
+            if content_hash in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(content_hash)
+            chunk.append(record)
+        
+        stats['rows_read'] += len(raw_chunk)
+        stats['rows_indexed'] += len(chunk)
+        stats['chunks'] += 1
+        stats['seconds'] = time.perf_counter() - started
+        stats['rows_per_second'] = stats['rows_read'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        if chunk:
+            yield chunk
+        if progress is not None:
+            progress(stats)
+
+def _print_progress(stats: Dict):
+    print(f"📥 {stats['rows_read']:,} satır okundu, {stats['rows_indexed']:,} eklendi "
+          f"({stats['rows_per_second']:,.0f} satır/s)")
+
+def ingest_dataset(store: "VectorStore", path: str, chunk_size: int = DATASET_CHUNK_SIZE,
+                   replace: bool = True, progress=_print_progress) -> Dict:
+    """Dataset dosyasını VectorStore'a chunk chunk yükler; yükleme istatistiklerini döner.
+    replace=True korpusu değiştirir (kalıcı modda dosya değişmediyse diskteki index kullanılır),
+    replace=False mevcut korpusa upsert eder."""
+    stats = {}
+    started = time.perf_counter()
+    chunks = iter_dataset_chunks(path, chunk_size, stats, progress)
+    
+    if replace:
+        store.add_prompt_chunks(chunks, _dataset_fingerprint(path, store) if store.persist_dir else None)
+    else:
+        for chunk in chunks:
+            store.upsert_prompts(chunk)
+    
+    stats['seconds'] = time.perf_counter() - started
+    stats['from_index'] = not stats.get('chunks') and bool(store.ids)
+    stats['rows_per_second'] = stats.get('rows_read', 0) / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    if stats['from_index']:
+        print(f"✅ Dataset diskteki index'ten yüklendi: {len(store.ids):,} prompt")
+    else:
+        print(f"✅ Dataset yüklendi: {stats['rows_indexed']:,} prompt ({stats['duplicates']:,} tekrar, "
+              f"{stats['invalid']:,} geçersiz) - {stats['seconds']:.1f}s, {stats['rows_per_second']:,.0f} satır/s")
+    return stats
+
+# ==================== RESPONSE CACHE ====================
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+@functools.lru_cache(maxsize=None)
+def _char_ngram_vectorizer():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(
+        analyzer='char_wb', ngram_range=(3, 4), n_features=2 ** 18,
+        alternate_sign=False, norm='l2'
+    )
+
+def _hashed_char_ngrams(text: str):
+    """Near-duplicate katmanı için stateless embedding: hash'lenmiş karakter n-gram'ları (L2 normalize)"""
+    return _char_ngram_vectorizer().transform([text]).tocsr()
+
+class ResponseCache:
+    """İki katmanlı yanıt cache'i.
+    
+    1. Exact: (normalize prompt, örnek id'leri, kategori/amaç, generation config) anahtarlı LRU + TTL
+    2. Near-duplicate (opsiyonel): aynı bağlamda, prompt embedding'i cosine eşiği içindeyse önceki yanıt
+    
+    Bellek hem entry sayısı hem yaklaşık byte bütçesi ile sınırlıdır."""
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0,
+                 max_bytes: int = 16 * 1024 * 1024, semantic_threshold: float = None,
+                 embed_fn=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.semantic_threshold = semantic_threshold
+        self.embed_fn = embed_fn or _hashed_char_ngrams
+        
+        self._entries = OrderedDict()  # key -> (expires_at, value, embedding, size)
+        self._by_context = {}          # context -> {key: embedding} (near-duplicate adayları)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+    
+    @staticmethod
+    def make_context(similar_examples: List[str], category: str, intent: str, generation_config: Dict) -> Tuple:
+        # Örnek id'leri VectorStore ile aynı şekilde içerikten türetilir
+        example_ids = tuple(_prompt_id({'prompt': example}) for example in similar_examples)
+        return (example_ids, category, intent, tuple(sorted(generation_config.items())))
+    
+    def get(self, prompt: str, context: Tuple, record_miss: bool = True):
+        """record_miss=False: sadece yoklama (ör. router) - asıl lookup miss'i tekrar saymasın"""
+        key = (_normalize_prompt(prompt), context)
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return entry[1]
+                self._remove(key)
+                self._counters['expirations'] += 1
+            
+            candidates = list(self._by_context.get(context, {}).items()) if self.semantic_threshold is not None else []
+        
+        if candidates:
+            embedding = self.embed_fn(key[0])
+            best_key, best_score = None, self.semantic_threshold
+            for candidate_key, candidate_embedding in candidates:
+                score = _cosine(embedding, candidate_embedding)
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            
+            with self._lock:
+                entry = self._entries.get(best_key) if best_key is not None else None
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(best_key)
+                    self._counters['semantic_hits'] += 1
+                    return entry[1]
+        
+        if record_miss:
+            with self._lock:
+                self._counters['misses'] += 1
+        return None
+    
+    def put(self, prompt: str, context: Tuple, value: str):
+        key = (_normalize_prompt(prompt), context)
+        embedding = self.embed_fn(key[0]) if self.semantic_threshold is not None else None
+        size = len(value.encode('utf-8')) + len(key[0].encode('utf-8'))
+        if embedding is not None and hasattr(embedding, 'nnz'):
+            size += embedding.nnz * 12
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, embedding, size)
+            self._bytes += size
+            if embedding is not None:
+                self._by_context.setdefault(context, {})[key] = embedding
+            
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+    
+    def _remove(self, key):
+        _, _, embedding, size = self._entries.pop(key)
+        self._bytes -= size
+        if embedding is not None:
+            bucket = self._by_context.get(key[1])
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._by_context[key[1]]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes)
+
+def _cosine(a, b) -> float:
+    # Embedding'ler L2 normalize: cosine = dot product (sparse veya dense)
+    if hasattr(a, 'multiply'):
+        return float(a.multiply(b).sum())
+    import numpy as np
+    return float(np.dot(a, b))
+
+# ==================== ASYNC LİMİTLER ====================
+class AsyncTokenBucket:
+    """Saniyede `rate` istek, en fazla `capacity` burst - asyncio token bucket rate limiter"""
+    
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# ==================== MODEL BACKENDS ====================
+class BackendError(RuntimeError):
+    """Model backend hatası - retryable=True ise aynı istek tekrar denenebilir"""
+    
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class ModelBackend:
+    """Model backend arayüzü: generate / agenerate / stream.
+    
+    Alt sınıflar en az generate'i uygular; async ve streaming varsayılan olarak ona dayanır."""
+    name = 'base'
+    display_name = 'Model'
+    available = False
+    
+    def generate(self, prompt: str, generation_config: Dict, timeout: float = None) -> str:
+        raise NotImplementedError
+    
+    async def agenerate(self, prompt: str, generation_config: Dict, timeout: float = None) -> str:
+        return await asyncio.to_thread(self.generate, prompt, generation_config, timeout)
+    
+    def stream(self, prompt: str, generation_config: Dict, timeout: float = None):
+        yield self.generate(prompt, generation_config, timeout)
+
+class GeminiBackend(ModelBackend):
+    """Gemini'ye SDK'nın public istemcileriyle (GenerativeServiceClient / AsyncClient) gidilir; her backend
+    kendi api_key'iyle kendi istemcisini kurar. Process-global genai.configure hiç çağrılmaz - farklı
+    anahtarlı backend'ler (ör. Streamlit oturumları) birbirinin anahtarını kullanamaz."""
+    name = 'gemini'
+    display_name = 'Gemini Pro'
+    
+    def __init__(self, api_key: str = None, model_name: str = 'gemini-pro'):
         self.available = False
-        self.model = None
+        self.client = None
+        self.model_name = model_name if model_name.startswith('models/') else f"models/{model_name}"
+        self._client_options = None
+        # Async istemcinin gRPC kanalı event loop'a bağlı - her loop için ayrı istemci
+        self._async_clients = weakref.WeakKeyDictionary()
         
-        if not GEMINI_AVAILABLE:
+        glm = _load_generativelanguage()
+        if glm is None:
             return
         
         api_key = api_key or os.environ.get('GEMINI_API_KEY')
@@ -106,33 +1920,457 @@ class GeminiRAGAgent:
             return
         
         try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self._client_options = {'api_key': api_key}
+            self.client = glm.GenerativeServiceClient(client_options=self._client_options)
             self.available = True
             print("✅ Gemini RAG Agent hazır!")
         except Exception as e:
             print(f"❌ Gemini hatası: {e}")
             self.available = False
     
-    def generate_optimized_prompt(self, user_prompt: str, similar_examples: List[str], context: Dict) -> str:
+    def generate(self, prompt: str, generation_config: Dict, timeout: float = None) -> str:
+        return self._text(self.client.generate_content(
+            request=self._request(prompt, generation_config), **self._request_options(timeout)
+        ))
+    
+    async def agenerate(self, prompt: str, generation_config: Dict, timeout: float = None) -> str:
+        response = await self._async_client().generate_content(
+            request=self._request(prompt, generation_config), **self._request_options(timeout)
+        )
+        return self._text(response)
+    
+    def stream(self, prompt: str, generation_config: Dict, timeout: float = None):
+        for chunk in self.client.stream_generate_content(
+            request=self._request(prompt, generation_config), **self._request_options(timeout)
+        ):
+            text = self._text(chunk)
+            if text:
+                yield text
+    
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = _load_generativelanguage().GenerativeServiceAsyncClient(client_options=self._client_options)
+            self._async_clients[loop] = client
+        return client
+    
+    def _request(self, prompt: str, generation_config: Dict):
+        glm = _load_generativelanguage()
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role='user', parts=[glm.Part(text=prompt)])],
+            generation_config=glm.GenerationConfig(**generation_config),
+        )
+    
+    @staticmethod
+    def _text(response) -> str:
+        # İlk adayın metni; aday yoksa (ör. güvenlik filtresi) tekrar denemek anlamsız
+        if not response.candidates:
+            raise BackendError(f"Gemini yanıt üretmedi: {response.prompt_feedback}", retryable=False)
+        return "".join(part.text for part in response.candidates[0].content.parts)
+    
+    @staticmethod
+    def _request_options(timeout: float = None) -> Dict:
+        return {'timeout': timeout} if timeout is not None else {}
+
+class FakeBackend(ModelBackend):
+    """API anahtarı gerektirmeyen deterministik yerel model - yük testi ve benchmark için.
+    
+    Her çağrı için seed'li RNG'den ilk-token gecikmesi (latency_mean ± latency_jitter, normal dağılım),
+    token hızı (tokens_per_second ± tokens_per_second_jitter) ve error_rate olasılıkla BackendError
+    çekilir. tokens_per_second=None ise üretim süresi sıfırdır. Çıktı metni prompt'tan deterministik türetilir."""
+    name = 'fake'
+    display_name = 'Fake Model'
+    
+    def __init__(self, latency_mean: float = 0.2, latency_jitter: float = 0.05, error_rate: float = 0.0,
+                 tokens_per_second: float = 200.0, tokens_per_second_jitter: float = 0.0,
+                 output_tokens: int = 48, seed: int = 0):
+        self.available = True
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_second_jitter = tokens_per_second_jitter
+        self.output_tokens = output_tokens
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def _plan(self, prompt: str, generation_config: Dict):
+        with self._lock:
+            self.calls += 1
+            latency = max(0.0, self._rng.gauss(self.latency_mean, self.latency_jitter))
+            failed = self._rng.random() < self.error_rate
+            token_delay = 0.0
+            if self.tokens_per_second:
+                rate = max(1.0, self._rng.gauss(self.tokens_per_second, self.tokens_per_second_jitter))
+                token_delay = 1.0 / rate
+        
+        n_tokens = min(self.output_tokens, generation_config.get('max_output_tokens', self.output_tokens))
+        words = prompt.split() or ['prompt']
+        offset = int(hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8], 16)
+        tokens = [words[(offset + i) % len(words)] for i in range(n_tokens)]
+        return latency, failed, token_delay, tokens
+    
+    def generate(self, prompt: str, generation_config: Dict, timeout: float = None) -> str:
+        latency, failed, token_delay, tokens = self._plan(prompt, generation_config)
+        total = latency + token_delay * len(tokens)
+        if timeout is not None and total > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"fake backend: {timeout:.2f}s deadline aşıldı")
+        time.sleep(latency)
+        if failed:
+            raise BackendError("fake backend: enjekte edilmiş hata")
+        time.sleep(token_delay * len(tokens))
+        return " ".join(tokens)
+    
+    async def agenerate(self, prompt: str, generation_config: Dict, timeout: float = None) -> str:
+        latency, failed, token_delay, tokens = self._plan(prompt, generation_config)
+        total = latency + token_delay * len(tokens)
+        if timeout is not None and total > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"fake backend: {timeout:.2f}s deadline aşıldı")
+        await asyncio.sleep(latency)
+        if failed:
+            raise BackendError("fake backend: enjekte edilmiş hata")
+        await asyncio.sleep(token_delay * len(tokens))
+        return " ".join(tokens)
+    
+    def stream(self, prompt: str, generation_config: Dict, timeout: float = None):
+        latency, failed, token_delay, tokens = self._plan(prompt, generation_config)
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"fake backend: {timeout:.2f}s deadline aşıldı")
+        time.sleep(latency)
+        if failed:
+            raise BackendError("fake backend: enjekte edilmiş hata")
+        for token in tokens:
+            time.sleep(token_delay)
+            yield token + " "
+
+def make_backend(name: str = None, api_key: str = None) -> ModelBackend:
+    """İsimle backend oluşturur: 'gemini' (varsayılan) veya 'fake'"""
+    name = (name or 'gemini').lower()
+    if name == 'fake':
+        return FakeBackend()
+    if name == 'gemini':
+        return GeminiBackend(api_key)
+    raise ValueError(f"Bilinmeyen model backend: {name}")
+
+# ==================== RESILIENCE ====================
+# google.api_core istisnaları import etmeden isimle tanınır
+_RETRYABLE_ERROR_NAMES = {
+    'ServiceUnavailable', 'ResourceExhausted', 'DeadlineExceeded', 'InternalServerError',
+    'TooManyRequests', 'GatewayTimeout', 'Aborted'
+}
+
+def is_retryable_error(error: Exception) -> bool:
+    if isinstance(error, BackendError):
+        return error.retryable
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _RETRYABLE_ERROR_NAMES:
+        return True
+    code = getattr(error, 'code', None)
+    return code in (429, 500, 502, 503, 504)
+
+class RetryPolicy:
+    """Çağrı başına deadline + sınırlı retry, full-jitter exponential backoff"""
+    
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 4.0,
+                 timeout: float = 15.0, seed: int = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+    
+    def backoff(self, attempt: int) -> float:
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+class CircuitBreaker:
+    """Son `window` çağrıda hata oranı eşiği aşınca açılır; cooldown boyunca istekleri reddeder
+    (pipeline doğrudan FallbackOptimizer'a gider), sonra tek deneme isteğiyle half-open olur."""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: float = 0.5, window: int = 20, min_calls: int = 5,
+                 cooldown_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        
+        self._state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # True = hata
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+        self._counters = {'opened': 0, 'rejected': 0, 'successes': 0, 'failures': 0}
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+    
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            # Deneme isteği sonuç bildirmeden kaybolursa (iptal vb.) cooldown sonra yeni deneme
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN and (
+                    not self._trial_in_flight or now - self._trial_started >= self.cooldown_seconds):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            self._counters['rejected'] += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self._counters['successes'] += 1
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                self._trial_in_flight = False
+            self._outcomes.append(False)
+    
+    def record_failure(self):
+        with self._lock:
+            self._counters['failures'] += 1
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(True)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_threshold):
+                self._open()
+    
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self._counters['opened'] += 1
+    
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            self._maybe_half_open()
+            failures = sum(self._outcomes)
+            return dict(
+                self._counters,
+                state=self._state,
+                error_rate=failures / len(self._outcomes) if self._outcomes else 0.0
+            )
+
+# ==================== GEMINI RAG AGENT ====================
+class GeminiRAGAgent:
+    GENERATION_CONFIG = {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'max_output_tokens': 1024,
+    }
+    
+    def __init__(self, api_key: str = None, cache: ResponseCache = None, backend: ModelBackend = None,
+                 routes: Dict[str, ModelBackend] = None, retry_policy: RetryPolicy = None,
+                 breaker_factory=None):
+        """backend: varsayılan model (None ise Gemini); routes: intent -> backend (istek sınıfına göre model).
+        Her backend'in kendi circuit breaker'ı vardır (breaker_factory ile özelleştirilebilir)."""
+        self.backend = backend if backend is not None else GeminiBackend(api_key)
+        self.routes = dict(routes or {})
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._breaker_factory = breaker_factory or CircuitBreaker
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+    
+    @property
+    def available(self) -> bool:
+        return self.backend.available
+    
+    def select_backend(self, context: Dict) -> ModelBackend:
+        backend = self.routes.get(context.get('intent'))
+        return backend if backend is not None and backend.available else self.backend
+    
+    def breaker_for(self, backend: ModelBackend) -> CircuitBreaker:
+        with self._breakers_lock:
+            breaker = self._breakers.get(backend.name)
+            if breaker is None:
+                breaker = self._breakers[backend.name] = self._breaker_factory()
+            return breaker
+    
+    def breaker_stats(self) -> Dict[str, Dict]:
+        with self._breakers_lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
+    
+    def generate_optimized_prompt(self, user_prompt: str, similar_examples: List[str], context: Dict,
+                                  trace: Dict = None) -> str:
+        """trace verilirse backend, retry sayısı, yaklaşık token sayıları ve son hata oraya yazılır"""
         if not self.available:
             return None
+        trace = trace if trace is not None else {}
         
+        backend = self.select_backend(context)
+        cache_context, cached = self._cache_lookup(user_prompt, similar_examples, context, backend)
+        if cached is not None:
+            return cached
+        
+        breaker = self.breaker_for(backend)
+        policy = self.retry_policy
         rag_prompt = self._build_rag_prompt(user_prompt, similar_examples, context)
+        _start_trace(trace, backend, rag_prompt)
         
-        try:
-            response = self.model.generate_content(
-                rag_prompt,
-                generation_config={
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'max_output_tokens': 1024,
-                }
-            )
-            return response.text.strip()
-        except Exception as e:
-            print(f"❌ Gemini generation hatası: {e}")
+        for attempt in range(policy.max_attempts):
+            # Breaker açıksa model hiç çağrılmaz - çağıran fallback'e düşer
+            if not breaker.allow_request():
+                trace['error'] = 'circuit_open'
+                return None
+            try:
+                optimized = backend.generate(rag_prompt, self.GENERATION_CONFIG, timeout=policy.timeout).strip()
+            except Exception as e:
+                breaker.record_failure()
+                trace['error'] = _error_name(e)
+                if not is_retryable_error(e) or attempt + 1 >= policy.max_attempts:
+                    print(f"❌ Gemini generation hatası: {e}")
+                    return None
+                trace['retries'] += 1
+                time.sleep(policy.backoff(attempt))
+                continue
+            
+            breaker.record_success()
+            _finish_trace(trace, optimized)
+            self._cache_store(user_prompt, cache_context, optimized)
+            return optimized
+        return None
+    
+    async def agenerate_optimized_prompt(self, user_prompt: str, similar_examples: List[str], context: Dict,
+                                         timeout: float = None, trace: Dict = None) -> str:
+        """Async varyant - retry/backoff/breaker/trace sync ile aynı; timeout tüm denemeleri kapsar"""
+        if not self.available:
             return None
+        trace = trace if trace is not None else {}
+        
+        backend = self.select_backend(context)
+        cache_context, cached = self._cache_lookup(user_prompt, similar_examples, context, backend)
+        if cached is not None:
+            return cached
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        breaker = self.breaker_for(backend)
+        policy = self.retry_policy
+        rag_prompt = self._build_rag_prompt(user_prompt, similar_examples, context)
+        _start_trace(trace, backend, rag_prompt)
+        
+        for attempt in range(policy.max_attempts):
+            call_timeout = policy.timeout
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    trace['error'] = 'deadline'
+                    return None
+                call_timeout = remaining if call_timeout is None else min(call_timeout, remaining)
+            
+            if not breaker.allow_request():
+                trace['error'] = 'circuit_open'
+                return None
+            try:
+                response = await asyncio.wait_for(
+                    backend.agenerate(rag_prompt, self.GENERATION_CONFIG, timeout=call_timeout), call_timeout
+                )
+                optimized = response.strip()
+            except Exception as e:
+                breaker.record_failure()
+                trace['error'] = _error_name(e)
+                if not is_retryable_error(e) or attempt + 1 >= policy.max_attempts:
+                    print(f"❌ Gemini generation hatası: {e!r}")
+                    return None
+                trace['retries'] += 1
+                await asyncio.sleep(policy.backoff(attempt))
+                continue
+            
+            breaker.record_success()
+            _finish_trace(trace, optimized)
+            self._cache_store(user_prompt, cache_context, optimized)
+            return optimized
+        return None
+    
+    def stream_optimized_prompt(self, user_prompt: str, similar_examples: List[str], context: Dict,
+                                trace: Dict = None):
+        """Optimize edilmiş prompt'u parça parça üretir (backend.stream).
+        Cache hit tek parça olarak döner. İlk parçadan önceki retryable hatalar tekrar denenir;
+        breaker açıksa veya sonrasında hata olursa istisna çağırana iletilir."""
+        if not self.available:
+            return
+        trace = trace if trace is not None else {}
+        
+        backend = self.select_backend(context)
+        cache_context, cached = self._cache_lookup(user_prompt, similar_examples, context, backend)
+        if cached is not None:
+            yield cached
+            return
+        
+        breaker = self.breaker_for(backend)
+        policy = self.retry_policy
+        rag_prompt = self._build_rag_prompt(user_prompt, similar_examples, context)
+        _start_trace(trace, backend, rag_prompt)
+        
+        parts = []
+        for attempt in range(policy.max_attempts):
+            if not breaker.allow_request():
+                trace['error'] = 'circuit_open'
+                raise BackendError("circuit breaker açık", retryable=False)
+            try:
+                for text in backend.stream(rag_prompt, self.GENERATION_CONFIG, timeout=policy.timeout):
+                    if text:
+                        parts.append(text)
+                        yield text
+            except Exception as e:
+                breaker.record_failure()
+                trace['error'] = _error_name(e)
+                if parts or not is_retryable_error(e) or attempt + 1 >= policy.max_attempts:
+                    raise
+                trace['retries'] += 1
+                time.sleep(policy.backoff(attempt))
+                continue
+            
+            breaker.record_success()
+            break
+        
+        optimized = "".join(parts).strip()
+        _finish_trace(trace, optimized)
+        self._cache_store(user_prompt, cache_context, optimized)
+    
+    def cached_response(self, user_prompt: str, similar_examples: List[str], context: Dict) -> str:
+        """Model çağırmadan cache'teki yanıt (yoksa None)"""
+        return self._cache_lookup(
+            user_prompt, similar_examples, context, self.select_backend(context), record_miss=False
+        )[1]
+    
+    def _cache_lookup(self, user_prompt: str, similar_examples: List[str], context: Dict, backend: ModelBackend,
+                      record_miss: bool = True):
+        if self.cache is None:
+            return None, None
+        cache_context = ResponseCache.make_context(
+            similar_examples[:3], context.get('category'), context.get('intent'),
+            dict(self.GENERATION_CONFIG, backend=backend.name)
+        )
+        return cache_context, self.cache.get(user_prompt, cache_context, record_miss=record_miss)
+    
+    def _cache_store(self, user_prompt: str, cache_context: Tuple, optimized: str):
+        if self.cache is not None and optimized:
+            self.cache.put(user_prompt, cache_context, optimized)
     
     def _build_rag_prompt(self, user_prompt: str, similar_examples: List[str], context: Dict) -> str:
         examples_text = "\n\n".join([
@@ -167,48 +2405,271 @@ KURALLAR:
 
 OPTİMİZE EDİLMİŞ PROMPT:"""
 
+def _start_trace(trace: Dict, backend: ModelBackend, rag_prompt: str):
+    trace.update(backend=backend.name, retries=0, prompt_tokens=estimate_tokens(rag_prompt))
+
+def _finish_trace(trace: Dict, optimized: str):
+    # Retry sonrası başarı: önceki denemenin hatası olaya yazılmaz
+    trace.pop('error', None)
+    trace['output_tokens'] = estimate_tokens(optimized)
+
+def _error_name(error: Exception) -> str:
+    return type(error).__name__
+
 # ==================== PROMPT ANALYZER ====================
+def _trie_pattern(keywords: List[str]) -> str:
+    """Anahtar kelimelerden prefix-trie yapılı regex - alternation'ı regex motoru tek geçişte tarar"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def emit(node) -> str:
+        optional = '' in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if optional:
+            # Daha uzun eşleşme önce denenir (greedy), yoksa kısa anahtar kelime kabul edilir
+            pattern = '(?:' + pattern + ')?'
+        return pattern
+    
+    return emit(trie)
+
 class PromptAnalyzer:
-    def analyze_prompt(self, prompt: str) -> Dict:
+    # Öncelik sırasına göre intent -> {anahtar kelime: ağırlık}
+    INTENT_KEYWORDS = {
+        'teaching': {'öğret': 1.0, 'nasıl': 1.0, 'anlat': 1.0, 'açıkla': 1.0},
+        'role_play': {'sen bir': 1.0, 'rolünde': 1.0},
+        'code_generation': {'kod yaz': 1.0, 'program': 1.0},
+        'content_creation': {'yaz': 1.0, 'oluştur': 1.0},
+    }
+    CATEGORY_BY_INTENT = {
+        'teaching': 'öğretim',
+        'role_play': 'rol oynama',
+        'code_generation': 'kod yazma',
+        'content_creation': 'içerik oluşturma',
+    }
+    # Kısıt / format / rol belirteçleri - sayıları spesifiklik skoruna girer (sayılar da belirteç)
+    SPECIFICITY_MARKERS = [
+        'adım adım', 'örnek', 'format', 'madde', 'tablo', 'liste', 'başlık', 'paragraf', 'cümle',
+        'kelime', 'en az', 'en fazla', 'ton', 'hedef kitle', 'kısıt', 'sen bir', 'rolünde', 'json', 'markdown',
+        'step by step', 'example', 'bullet', 'table', 'words', 'at least', 'at most', 'tone', 'audience',
+        'you are', 'act as',
+    ]
+    MARKER_SATURATION = 4
+    # Spesifiklik bileşen ağırlıkları; eksik bileşen (korpus/komşu yok) ağırlıktan düşülür
+    SPECIFICITY_WEIGHTS = {'rarity': 0.4, 'markers': 0.35, 'neighbour': 0.25}
+    LENGTH_WEIGHT = 0.4
+    
+    def __init__(self, intent_keywords: Dict[str, Dict[str, float]] = None, corpus=None):
+        self.intent_keywords = intent_keywords if intent_keywords is not None else self.INTENT_KEYWORDS
+        # corpus: `corpus_stats` özelliği olan nesne (VectorStore) - her analizde güncel istatistik okunur
+        self.corpus = corpus
+        # Belirteç metin başında ya da boşluk / parantez / tırnaktan sonra başlar (lookbehind: toplu taramada
+        # metinler arası ayırıcı da boşluk sayılır)
+        self._marker_trie = _trie_pattern(self.SPECIFICITY_MARKERS)
+        self._marker_matcher = re.compile(r"(?<![^\s(\"'])" + "(?:" + self._marker_trie + r")|\d+")
+        
+        # Keyword automaton bir kez kurulur: eşleşen metin -> [(intent, ağırlık)]
+        self._keyword_intents = {}
+        for intent, keywords in self.intent_keywords.items():
+            for keyword, weight in keywords.items():
+                self._keyword_intents.setdefault(keyword.lower(), []).append((intent, weight))
+        self._matcher = re.compile(_trie_pattern(list(self._keyword_intents))) if self._keyword_intents else None
+    
+    def analyze_prompt(self, prompt: str, nearest_distance: float = None, intents: Tuple[str, Dict] = None) -> Dict:
+        """nearest_distance: en yakın korpus örneğine cosine mesafesi (retrieval sonucundan)
+        intents: aynı prompt için önceden hesaplanmış match_intents sonucu - verilirse prompt tekrar taranmaz"""
         word_count = len(prompt.split())
+        intent, intent_scores = intents if intents is not None else self.match_intents(prompt)
+        
+        length_score = 0.4 if word_count < 10 else 0.7
+        stats = self._corpus_stats()
+        specificity = self._specificity_score(
+            stats.rarity(prompt) if stats is not None else None,
+            len(self._marker_matcher.findall(prompt.lower())),
+            nearest_distance
+        )
         
         return {
-            'length_score': 0.4 if word_count < 10 else 0.7,
-            'specificity_score': 0.3,
-            'overall_score': 0.4,
+            'length_score': length_score,
+            'specificity_score': specificity,
+            'overall_score': self.LENGTH_WEIGHT * length_score + (1 - self.LENGTH_WEIGHT) * specificity,
             'issues': ['Çok kısa', 'Detay eksik'] if word_count < 10 else [],
             'word_count': word_count,
-            'category': self._detect_category(prompt),
-            'intent': self._detect_intent(prompt)
+            'category': self.CATEGORY_BY_INTENT.get(intent, 'genel'),
+            'intent': intent,
+            'intent_scores': intent_scores
         }
     
-    def _detect_intent(self, prompt: str) -> str:
-        prompt_lower = prompt.lower()
+    def analyze_batch(self, prompts, nearest_distances=None, intents=None) -> "pd.DataFrame":
+        """Vektörel toplu analiz - list/Series alır, analyze_prompt alanlarını kolon olarak döner
+        (intent skorları `score_<intent>` kolonlarında, issues tuple olarak). nearest_distances
+        verilirse prompt'larla aynı sırada olmalıdır; intents (prompt başına match_intents sonucu)
+        verilirse intent kolonları onlardan alınır, prompt'lar tekrar taranmaz.
         
-        if any(kw in prompt_lower for kw in ['öğret', 'nasıl', 'anlat', 'açıkla']):
-            return 'teaching'
-        elif any(kw in prompt_lower for kw in ['sen bir', 'rolünde']):
-            return 'role_play'
-        elif any(kw in prompt_lower for kw in ['kod yaz', 'program']):
-            return 'code_generation'
-        elif any(kw in prompt_lower for kw in ['yaz', 'oluştur']):
-            return 'content_creation'
+        Tekrarlanan prompt'lar bir kez analiz edilir. Intent, belirteç ve (korpus varsa) token taramaları tüm
+        batch için birer kez yapılır: pyarrow varsa Arrow (RE2) kernel'larında, yoksa prompt'lar birleştirilip tek
+        regex geçişiyle; metin başına skorlar bincount ile toplanır. Sonuçlar analyze_prompt ile birebir aynıdır."""
+        import numpy as np
+        import pandas as pd
         
-        return 'general'
-    
-    def _detect_category(self, prompt: str) -> str:
-        intent = self._detect_intent(prompt)
+        index = prompts.index if isinstance(prompts, pd.Series) else None
+        codes, uniques = pd.factorize(pd.Series(list(prompts), dtype=object), sort=False)
+        uniques = np.asarray(uniques, dtype=object)
         
-        if intent == 'teaching':
-            return 'öğretim'
-        elif intent == 'role_play':
-            return 'rol oynama'
-        elif intent == 'code_generation':
-            return 'kod yazma'
-        elif intent == 'content_creation':
-            return 'içerik oluşturma'
+        lowered = _lower_all(uniques.tolist())
+        strings = _arrow_strings(lowered)
+        word_count = np.fromiter(map(len, map(str.split, uniques)), dtype=np.int64, count=len(uniques))
+        
+        # Her tekil prompt'un ilk görüldüğü satır (mesafe / hazır intent'ler satır bazında gelir)
+        first = np.empty(len(uniques), dtype=np.intp)
+        first[codes[::-1]] = np.arange(len(codes))[::-1]
+        
+        if intents is not None:
+            chosen = [intents[row] for row in first]
+            scores = {
+                name: np.fromiter((matched.get(name, 0.0) for _, matched in chosen), dtype=float, count=len(chosen))
+                for name in self.intent_keywords
+            }
+            intent = np.array([name for name, _ in chosen], dtype=object)
+            category = np.array([self.CATEGORY_BY_INTENT.get(name, 'genel') for name in intent], dtype=object)
+        else:
+            # Intent skorları: match_intents'in matcher'ı tek geçişte; eşleşen anahtar kelime -> intent ağırlıkları
+            names = list(self.intent_keywords)
+            scores = {name: np.zeros(len(uniques)) for name in names}
+            if self._matcher is not None:
+                found = _arrow_findall(strings, self._matcher.pattern) if strings is not None else None
+                doc, matched, keywords = found if found is not None else _findall_batch(self._matcher, lowered)
+                weights = np.zeros((len(keywords), len(names)))
+                for row, keyword in enumerate(keywords):
+                    for name, weight in self._keyword_intents.get(keyword, ()):
+                        weights[row, names.index(name)] += weight
+                for column, name in enumerate(names):
+                    scores[name] = np.bincount(doc, weights=weights[matched, column], minlength=len(uniques))
+            
+            # Öncelik sırasındaki ilk eşleşen intent; kod = intent sırası, eşleşme yoksa 'general'
+            intent_code = np.full(len(uniques), len(names), dtype=np.intp)
+            for code, score in reversed(list(enumerate(scores.values()))):
+                intent_code[score != 0] = code
+            names.append('general')
+            intent = np.array(names, dtype=object)[intent_code]
+            category = np.array([self.CATEGORY_BY_INTENT.get(name, 'genel') for name in names], dtype=object)[intent_code]
+        
+        # Spesifiklik: analyze_prompt ile aynı bileşenler, kolon bazında
+        stats = self._corpus_stats()
+        weights = self.SPECIFICITY_WEIGHTS
+        if strings is not None:
+            import pyarrow.compute as pc
+            
+            # RE2'de lookbehind yok: önceki karakter eşleşmeye dahil; Arrow '^'yı her eşleşmeden sonra yeniden
+            # bağladığından metin başı için '^' yerine başa boşluk eklenir
+            classes = _unicode_classes()
+            padded = pc.utf8_replace_slice(strings, start=0, stop=0, replacement=" ")
+            marker_count = pc.count_substring_regex(
+                padded, f"[{classes['space']}(\"'](?:{self._marker_trie})|[{classes['digit']}]+"
+            ).to_numpy(zero_copy_only=False)
+        else:
+            marker_count = np.bincount(_findall_batch(self._marker_matcher, lowered)[0], minlength=len(uniques))
+        weighted = weights['markers'] * np.minimum(marker_count / self.MARKER_SATURATION, 1.0)
+        total_weight = np.full(len(uniques), weights['markers'])
+        if stats is not None:
+            rarity = stats.rarity_batch(lowered, lowercase=False)
+            weighted += weights['rarity'] * np.clip(rarity, 0.0, 1.0)
+            total_weight += weights['rarity']
+        if nearest_distances is not None:
+            # Aynı prompt'un mesafesi aynıdır - ilk görüldüğü satırınki
+            distance = np.asarray(nearest_distances, dtype=float)[first]
+            known = ~np.isnan(distance)
+            weighted += np.where(known, weights['neighbour'] * np.clip(1.0 - distance, 0.0, 1.0), 0.0)
+            total_weight += np.where(known, weights['neighbour'], 0.0)
+        specificity = weighted / total_weight
+        
+        short = word_count < 10
+        length_score = np.where(short, 0.4, 0.7)
+        issue_choices = np.empty(2, dtype=object)
+        issue_choices[:] = [(), ('Çok kısa', 'Detay eksik')]
+        issues = issue_choices[short.astype(np.intp)]
         
-        return 'genel'
+        columns = {
+            'prompt': uniques,
+            'length_score': length_score,
+            'specificity_score': specificity,
+            'overall_score': self.LENGTH_WEIGHT * length_score + (1 - self.LENGTH_WEIGHT) * specificity,
+            'issues': issues,
+            'word_count': word_count,
+            'category': category,
+            'intent': intent,
+        }
+        columns.update({f'score_{name}': score for name, score in scores.items()})
+        
+        # Tekil sonuçları orijinal satırlara yay
+        return pd.DataFrame({name: values[codes] for name, values in columns.items()}, index=index)
+    
+    def analyze_prompts(self, prompts: List[str], nearest_distances: List[float] = None,
+                        intents: List[Tuple[str, Dict]] = None) -> List[Dict]:
+        """analyze_batch, analyze_prompt biçiminde (prompt başına dict) - pipeline'ın batch yolları için.
+        nearest_distances içinde None olabilir (komşu yok)."""
+        if not prompts:
+            return []
+        frame = self.analyze_batch(list(prompts), nearest_distances, intents)
+        score_columns = [(name, f'score_{name}') for name in self.intent_keywords]
+        analyses = []
+        for i, row in enumerate(frame.to_dict('records')):
+            if intents is not None:
+                intent_scores = intents[i][1]
+            else:
+                intent_scores = {name: row[column] for name, column in score_columns if row[column]}
+            analyses.append({
+                'length_score': row['length_score'],
+                'specificity_score': row['specificity_score'],
+                'overall_score': row['overall_score'],
+                'issues': list(row['issues']),
+                'word_count': row['word_count'],
+                'category': row['category'],
+                'intent': row['intent'],
+                'intent_scores': intent_scores
+            })
+        return analyses
+    
+    def _corpus_stats(self):
+        return getattr(self.corpus, 'corpus_stats', None)
+    
+    def _specificity_score(self, rarity: float, marker_count: int, nearest_distance: float = None) -> float:
+        """IDF nadirliği, kısıt/format belirteçleri ve en yakın örneğe benzerliğin ağırlıklı ortalaması"""
+        weights = self.SPECIFICITY_WEIGHTS
+        weighted = weights['markers'] * min(marker_count / self.MARKER_SATURATION, 1.0)
+        total_weight = weights['markers']
+        if rarity is not None:
+            weighted += weights['rarity'] * min(max(rarity, 0.0), 1.0)
+            total_weight += weights['rarity']
+        if nearest_distance is not None:
+            weighted += weights['neighbour'] * min(max(1.0 - nearest_distance, 0.0), 1.0)
+            total_weight += weights['neighbour']
+        return weighted / total_weight
+    
+    def match_intents(self, prompt: str) -> Tuple[str, Dict[str, float]]:
+        """Tek geçişte tüm intent eşleşmeleri; ağırlıklı skorlar ve öncelik sırasındaki ilk eşleşen intent"""
+        scores = {}
+        if self._matcher is not None:
+            for match in self._matcher.finditer(prompt.lower()):
+                for intent, weight in self._keyword_intents[match.group()]:
+                    scores[intent] = scores.get(intent, 0.0) + weight
+        
+        for intent in self.intent_keywords:
+            if scores.get(intent):
+                return intent, scores
+        return 'general', scores
+    
+    def detect_intent(self, prompt: str) -> str:
+        return self.match_intents(prompt)[0]
+    
+    def _detect_category(self, prompt: str) -> str:
+        return self.CATEGORY_BY_INTENT.get(self.detect_intent(prompt), 'genel')
 
 # ==================== FALLBACK OPTIMIZER ====================
 class FallbackOptimizer:
@@ -226,91 +2687,490 @@ class FallbackOptimizer:
         else:
             return f"{topic.capitalize()} hakkında detaylı ve kapsamlı bir yanıt ver. Örnekler kullan, net açıklamalar yap."
     
+    def adapt_example(self, original: str, example: str, context: Dict) -> str:
+        """Router'ın 'example' route'u için: örneğin rol cümlesi kullanıcının konusuyla yeniden yazılır,
+        talimatlar korunur. Rol cümlesi olmayan örneklere konu eklenir."""
+        if not (example.startswith('Sen bir') and '.' in example):
+            return f"{example.rstrip()} Konu: {self._extract_topic(original)}."
+        if original.startswith('Sen bir') and '.' in original:
+            # Kullanıcı rolü zaten vermiş - kendi rol cümlesi korunur
+            role = original.split('.', 1)[0]
+        else:
+            role = f"Sen bir {self._extract_topic(original)} uzmanısın"
+        return f"{role}. {example.split('.', 1)[1].strip()}"
+    
     def _extract_topic(self, prompt: str) -> str:
         stop_words = ['sen', 'bir', 'bana', 'hakkında', 'yaz', 'öğret']
-        words = [w for w in prompt.split() if w.lower() not in stop_words and len(w) > 2]
+        words = [w.strip('.,;:!?') for w in prompt.split()]
+        words = [w for w in words if w.lower() not in stop_words and len(w) > 2]
         return ' '.join(words[:2]) if words else 'konu'
 
+# ==================== ROUTER ====================
+class PromptRouter:
+    """RETRIEVE ile GENERATE arasındaki karar: model çağrısı gerçekten gerekli mi?
+    
+    Sırasıyla: kalite eşiği üstü -> 'skip', çok yakın örnek -> 'example', model yok / breaker açık ->
+    'fallback', cache'te yanıt -> 'cache', aksi halde -> 'model'. Sadece 'model' LLM çağrısı yapar.
+    example_distance=None 'example' route'unu kapatır."""
+    
+    ROUTES = ('skip', 'example', 'fallback', 'cache', 'model')
+    # Analyzer intent'i ile örnek 'type' metadata'sı örtüşüyorsa mesafeye bonus verilir
+    EXAMPLE_TYPES_BY_INTENT = {
+        'teaching': ('teaching',),
+        'code_generation': ('coding',),
+        'content_creation': ('writing',),
+    }
+    
+    def __init__(self, agent: GeminiRAGAgent, quality_threshold: float = None,
+                 example_distance: float = 0.35, intent_match_bonus: float = 0.3):
+        self.agent = agent
+        self.quality_threshold = quality_threshold
+        self.example_distance = example_distance
+        self.intent_match_bonus = intent_match_bonus
+        self._counts = dict.fromkeys(self.ROUTES, 0)
+        self._lock = threading.Lock()
+    
+    def route(self, user_prompt: str, analysis: Dict, similar_prompts: Dict) -> Tuple[str, str]:
+        """(route, hazır metin) döner - 'example' için en yakın örnek (pipeline konuya uyarlar),
+        'cache' için cache'teki yanıt"""
+        route, text = self._decide(user_prompt, analysis, similar_prompts)
+        with self._lock:
+            self._counts[route] += 1
+        return route, text
+    
+    def _decide(self, user_prompt: str, analysis: Dict, similar_prompts: Dict) -> Tuple[str, str]:
+        if self.quality_threshold is not None and analysis['overall_score'] >= self.quality_threshold:
+            return 'skip', None
+        
+        distance = _nearest_distance(similar_prompts) if self.example_distance is not None else None
+        if distance is not None:
+            metadatas = similar_prompts.get('metadatas') or [[]]
+            example_type = metadatas[0][0].get('type') if metadatas[0] and metadatas[0][0] else None
+            if example_type in self.EXAMPLE_TYPES_BY_INTENT.get(analysis.get('intent'), ()):
+                distance -= self.intent_match_bonus
+            if distance <= self.example_distance:
+                return 'example', _similar_examples(similar_prompts)[0]
+        
+        if not self.agent.available or self.agent.breaker_for(self.agent.select_backend(analysis)).state == 'open':
+            return 'fallback', None
+        
+        cached = self.agent.cached_response(user_prompt, _similar_examples(similar_prompts), analysis)
+        if cached is not None:
+            return 'cache', cached
+        return 'model', None
+    
+    def stats(self) -> Dict:
+        """Route dağılımı ve LLM çağrısı yapılmadan cevaplanan trafik oranı"""
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return dict(
+            counts,
+            total=total,
+            llm_free_ratio=(total - counts['model']) / total if total else 0.0
+        )
+
 # ==================== ANA RAG PIPELINE ====================
+# Yerleşik örnek kütüphane - dataset_path verilmezse index bunlarla kurulur
+DEFAULT_PROMPTS = [
+    {
+        "act": "Python Teacher",
+        "prompt": "Sen bir Python öğretmenisin. Öğrencilere Python'ı adım adım öğret. Temel syntax'tan başla, her kavramı örneklerle açıkla, kod alıştırmaları ver. Sabırlı, net ve teşvik edici ol.",
+        "type": "teaching"
+    },
+    {
+        "act": "Code Reviewer",
+        "prompt": "Sen bir senior developer'sın. Kodu incele: okunabilirlik, performans, güvenlik, best practices. Yapıcı geri bildirim ver, alternatif çözümler öner.",
+        "type": "coding"
+    },
+    {
+        "act": "Academic Writer",
+        "prompt": "Sen bir akademik yazarsın. Yapı: Giriş (bağlam, tez), Gelişme (argümanlar, kanıtlar), Sonuç (özet, çıkarımlar). Formal dil, kaynak göster, objektif ol.",
+        "type": "writing"
+    },
+    {
+        "act": "Math Teacher",
+        "prompt": "Sen bir matematik öğretmenisin. Konsepti açıkla, adım adım çöz, alternatif yöntemler göster, pratik problemler ver. Görsel yardımcılar kullan.",
+        "type": "teaching"
+    },
+    {
+        "act": "Business Analyst",
+        "prompt": "Sen bir iş analistisin. Veri analizi yap, KPI'lar tanımla, insights sun, iyileştirme önerileri getir. SWOT, market research kullan.",
+        "type": "business"
+    },
+    {
+        "act": "Content Writer",
+        "prompt": "Sen bir içerik yazarısın. SEO-friendly, engaging içerik yaz. Net başlıklar, değer kat, hedef kitleye uygun ton, CTA ekle.",
+        "type": "writing"
+    },
+    {
+        "act": "UX Designer",
+        "prompt": "Sen bir UX tasarımcısısın. User-centered design yap, wireframes oluştur, usability test et. Accessibility standartlarına uy.",
+        "type": "design"
+    },
+    {
+        "act": "Data Scientist",
+        "prompt": "Sen bir veri bilimcisin. Veri analizi yap, ML modelleri oluştur, istatistiksel analiz gerçekleştir. Python kullan, görselleştir.",
+        "type": "data"
+    }
+]
+
+def load_vector_store(index_dir: str = None, dataset_path: str = None, ann_nprobe: int = None,
+                      embedder: Embedder = None, search_mode: str = 'cascade') -> VectorStore:
+    """Index'i kurar ve prompt kütüphanesini yükler. Sonuç pipeline'lar arasında paylaşılabilir
+    (ör. farklı API anahtarlı pipeline'lar aynı index'i kullanır)."""
+    vector_store = VectorStore(
+        persist_dir=index_dir, ann_nprobe=ann_nprobe, embedder=embedder, search_mode=search_mode
+    )
+    if dataset_path:
+        ingest_dataset(vector_store, dataset_path)
+    else:
+        vector_store.add_prompts(DEFAULT_PROMPTS)
+    return vector_store
+
 class GeminiPromptLabRAG:
-    def __init__(self, gemini_api_key: str = None):
+    def __init__(self, gemini_api_key: str = None, index_dir: str = None, response_cache: ResponseCache = None,
+                 max_concurrency: int = 8, requests_per_second: float = None,
+                 backend: ModelBackend = None, backend_routes: Dict[str, ModelBackend] = None,
+                 quality_threshold: float = None, dataset_path: str = None, filter_by_intent: bool = True,
+                 ann_nprobe: int = None, embedder: Embedder = None, search_mode: str = 'cascade',
+                 vector_store: VectorStore = None, metrics_sinks: List[MetricsSink] = None,
+                 example_distance: float = 0.35):
         print("🎯 PromptLab RAG Pipeline başlatılıyor...")
         
-        self.analyzer = PromptAnalyzer()
-        self.vector_store = VectorStore()
-        self.gemini_agent = GeminiRAGAgent(gemini_api_key)
-        self.fallback_optimizer = FallbackOptimizer()
+        # filter_by_intent: retrieval sadece intent'e uygun 'type' bölümünde yapılır (eksikler filtresiz tamamlanır)
+        self.filter_by_intent = filter_by_intent
+        
+        # Her istek bir olay: aşama süreleri, retrieval kaynağı, route, cache, retry, token.
+        # self.metrics (process içi histogramlar) her zaman; metrics_sinks (ör. JsonLinesMetrics) ek hedefler
+        self.metrics = InMemoryMetrics()
+        self._metrics_sinks = [self.metrics] + list(metrics_sinks or [])
         
-        self._load_dataset()
+        # Async yol: aynı anda en fazla max_concurrency model çağrısı, opsiyonel rate limit
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self._async_limits_by_loop = weakref.WeakKeyDictionary()
+        
+        # vector_store verilirse hazır (paylaşılan) index kullanılır - dataset tekrar yüklenmez.
+        # dataset_path: JSONL/CSV/Parquet (act, prompt, type) - verilmezse yerleşik örnekler
+        if vector_store is None:
+            vector_store = load_vector_store(index_dir, dataset_path, ann_nprobe, embedder, search_mode)
+        self.vector_store = vector_store
+        self.analyzer = PromptAnalyzer(corpus=self.vector_store)
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.gemini_agent = GeminiRAGAgent(
+            gemini_api_key, cache=self.response_cache, backend=backend, routes=backend_routes
+        )
+        self.fallback_optimizer = FallbackOptimizer()
+        # overall_score quality_threshold üzerindeyse prompt zaten yeterince iyi - model çağrılmaz
+        # example_distance: en yakın örnek bu mesafedeyse model çağrılmaz (None = kapalı)
+        self.router = PromptRouter(
+            self.gemini_agent, quality_threshold=quality_threshold, example_distance=example_distance
+        )
         
         mode = "Gemini RAG" if self.gemini_agent.available else "Fallback"
         print(f"✅ PROMPTLAB HAZIR! (Mod: {mode})")
     
-    def _load_dataset(self):
-        dataset = [
-            {
-                "act": "Python Teacher",
-                "prompt": "Sen bir Python öğretmenisin. Öğrencilere Python'ı adım adım öğret. Temel syntax'tan başla, her kavramı örneklerle açıkla, kod alıştırmaları ver. Sabırlı, net ve teşvik edici ol.",
-                "type": "teaching"
-            },
-            {
-                "act": "Code Reviewer",
-                "prompt": "Sen bir senior developer'sın. Kodu incele: okunabilirlik, performans, güvenlik, best practices. Yapıcı geri bildirim ver, alternatif çözümler öner.",
-                "type": "coding"
-            },
-            {
-                "act": "Academic Writer",
-                "prompt": "Sen bir akademik yazarsın. Yapı: Giriş (bağlam, tez), Gelişme (argümanlar, kanıtlar), Sonuç (özet, çıkarımlar). Formal dil, kaynak göster, objektif ol.",
-                "type": "writing"
-            },
-            {
-                "act": "Math Teacher",
-                "prompt": "Sen bir matematik öğretmenisin. Konsepti açıkla, adım adım çöz, alternatif yöntemler göster, pratik problemler ver. Görsel yardımcılar kullan.",
-                "type": "teaching"
-            },
-            {
-                "act": "Business Analyst",
-                "prompt": "Sen bir iş analistisin. Veri analizi yap, KPI'lar tanımla, insights sun, iyileştirme önerileri getir. SWOT, market research kullan.",
-                "type": "business"
-            },
-            {
-                "act": "Content Writer",
-                "prompt": "Sen bir içerik yazarısın. SEO-friendly, engaging içerik yaz. Net başlıklar, değer kat, hedef kitleye uygun ton, CTA ekle.",
-                "type": "writing"
-            },
-            {
-                "act": "UX Designer",
-                "prompt": "Sen bir UX tasarımcısısın. User-centered design yap, wireframes oluştur, usability test et. Accessibility standartlarına uy.",
-                "type": "design"
-            },
-            {
-                "act": "Data Scientist",
-                "prompt": "Sen bir veri bilimcisin. Veri analizi yap, ML modelleri oluştur, istatistiksel analiz gerçekleştir. Python kullan, görselleştir.",
-                "type": "data"
-            }
+    def process_prompt(self, user_prompt: str) -> Dict:
+        """Ana RAG işlemi - HER ZAMAN rag_mode döndürür"""
+        trace = RequestTrace('sync')
+        
+        # 1. RETRIEVE (intent bir kez taranır: retrieval filtresi ve analiz aynı sonucu kullanır)
+        with trace.stage('retrieve'):
+            intents = self.analyzer.match_intents(user_prompt)
+            similar_prompts = self._retrieve(user_prompt, intent=intents[0])
+        
+        # 2. ANALYZE (en yakın örneğe mesafe spesifiklik skoruna girer)
+        with trace.stage('analyze'):
+            analysis = self.analyzer.analyze_prompt(user_prompt, _nearest_distance(similar_prompts), intents)
+        
+        # 3. ROUTE + GENERATE
+        return self._generate(user_prompt, analysis, similar_prompts, trace)
+    
+    def process_batch(self, prompts: List[str]) -> List[Dict]:
+        """Toplu RAG işlemi - analiz ve retrieval tüm batch için tek seferde, sonuçlar girdi sırasında.
+        Ortak aşamaların süresi metriklerde prompt'lara eşit paylaştırılır."""
+        prompts = list(prompts)
+        batch = RequestTrace('batch')
+        
+        # 1. RETRIEVE
+        with batch.stage('retrieve'):
+            intents = [self.analyzer.match_intents(prompt) for prompt in prompts]
+            similar = self._retrieve_batch(prompts, intents=[intent for intent, _ in intents])
+        
+        # 2. ANALYZE - vektörel, tüm batch tek seferde
+        with batch.stage('analyze'):
+            analyses = self.analyzer.analyze_prompts(
+                prompts, [_nearest_distance(similar_prompts) for similar_prompts in similar], intents
+            )
+        
+        # 3. ROUTE + GENERATE
+        return [
+            self._generate(prompt, analysis, similar_prompts, _share_trace(batch, len(prompts)))
+            for prompt, analysis, similar_prompts in zip(prompts, analyses, similar)
         ]
+    
+    def process_prompt_stream(self, user_prompt: str):
+        """Streaming RAG işlemi - {'type': 'chunk', 'text': ...} olayları, en sonda {'type': 'result', 'result': ...}.
+        Nihai metin her zaman result içindedir (stream yarıda kalırsa fallback sonucu)."""
+        trace = RequestTrace('stream')
+        
+        # 1. RETRIEVE
+        with trace.stage('retrieve'):
+            intents = self.analyzer.match_intents(user_prompt)
+            similar_prompts = self._retrieve(user_prompt, intent=intents[0])
+        
+        # 2. ANALYZE
+        with trace.stage('analyze'):
+            analysis = self.analyzer.analyze_prompt(user_prompt, _nearest_distance(similar_prompts), intents)
+        
+        # 3. ROUTE
+        with trace.stage('route'):
+            route, optimized = self.router.route(user_prompt, analysis, similar_prompts)
+        if route == 'cache':
+            trace.mark('first_chunk')
+            yield {'type': 'chunk', 'text': optimized}
+        
+        # 4. GENERATE (süre tüketicinin parçaları işleme süresini de içerir)
+        if route == 'model':
+            parts = []
+            start = time.perf_counter()
+            try:
+                for chunk in self.gemini_agent.stream_optimized_prompt(
+                    user_prompt, _similar_examples(similar_prompts), analysis, trace=trace.fields
+                ):
+                    trace.mark('first_chunk')
+                    parts.append(chunk)
+                    yield {'type': 'chunk', 'text': chunk}
+                optimized = "".join(parts).strip() or None
+            except Exception as e:
+                print(f"❌ Gemini streaming hatası: {e}")
+                optimized = None
+            trace.stages['generate'] = time.perf_counter() - start
         
-        self.vector_store.add_prompts(dataset)
+        result = self._build_result(user_prompt, analysis, similar_prompts, optimized, route)
+        yield {'type': 'result', 'result': self._record(trace, result, similar_prompts)}
     
-    def process_prompt(self, user_prompt: str) -> Dict:
-        """Ana RAG işlemi - HER ZAMAN rag_mode döndürür"""
+    async def aprocess_prompt(self, user_prompt: str, timeout: float = None) -> Dict:
+        """Async RAG işlemi - retrieval executor'da, model çağrısı semaphore + rate limiter arkasında.
+        timeout (saniye) aşılırsa FallbackOptimizer sonucu döner."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        trace = RequestTrace('async')
         
-        # 1. ANALYZE
-        analysis = self.analyzer.analyze_prompt(user_prompt)
+        # 1. RETRIEVE
+        with trace.stage('retrieve'):
+            intents = self.analyzer.match_intents(user_prompt)
+            similar_prompts = await loop.run_in_executor(None, self._retrieve, user_prompt, 3, intents[0])
         
-        # 2. RETRIEVE
-        similar_prompts = self.vector_store.search_similar_prompts(user_prompt, n_results=3)
-        similar_examples = similar_prompts['documents'][0] if similar_prompts['documents'][0] else []
+        # 2. ANALYZE
+        with trace.stage('analyze'):
+            analysis = self.analyzer.analyze_prompt(user_prompt, _nearest_distance(similar_prompts), intents)
         
-        # 3. GENERATE
-        if self.gemini_agent.available:
-            optimized = self.gemini_agent.generate_optimized_prompt(
-                user_prompt, similar_examples, analysis
+        # 3. ROUTE
+        with trace.stage('route'):
+            route, optimized = self.router.route(user_prompt, analysis, similar_prompts)
+        
+        # 4. GENERATE
+        if route == 'model':
+            optimized = await self._agenerate(user_prompt, analysis, similar_prompts, deadline, trace)
+        result = self._build_result(user_prompt, analysis, similar_prompts, optimized, route)
+        return self._record(trace, result, similar_prompts)
+    
+    async def aprocess_batch(self, prompts: List[str], timeout: float = None) -> List[Dict]:
+        """Async toplu işlem - tek batch retrieval, model çağrıları eşzamanlı; sonuçlar girdi sırasında.
+        timeout her istek için ayrı uygulanır: süre isteğin sırası geldiğinde (semaphore / rate limiter
+        sonrası) başlar, batch'in sonundaki istekler kuyrukta beklediği için erken fallback'e düşmez."""
+        prompts = list(prompts)
+        loop = asyncio.get_running_loop()
+        batch = RequestTrace('async_batch')
+        
+        # 1. RETRIEVE
+        with batch.stage('retrieve'):
+            intents = [self.analyzer.match_intents(prompt) for prompt in prompts]
+            similar = await loop.run_in_executor(
+                None, self._retrieve_batch, prompts, 3, [intent for intent, _ in intents]
             )
-            
+        
+        # 2. ANALYZE - vektörel, tüm batch tek seferde
+        with batch.stage('analyze'):
+            analyses = self.analyzer.analyze_prompts(
+                prompts, [_nearest_distance(similar_prompts) for similar_prompts in similar], intents
+            )
+        
+        # 3. ROUTE
+        with batch.stage('route'):
+            routed = [
+                self.router.route(prompt, analysis, similar_prompts)
+                for prompt, analysis, similar_prompts in zip(prompts, analyses, similar)
+            ]
+        traces = [_share_trace(batch, len(prompts)) for _ in prompts]
+        
+        # 4. GENERATE - sadece 'model' route'ları modele gider
+        optimized = await asyncio.gather(*(
+            self._agenerate(prompt, analysis, similar_prompts, trace=trace, timeout=timeout) if route == 'model'
+            else _resolved(text)
+            for prompt, analysis, similar_prompts, (route, text), trace in zip(prompts, analyses, similar, routed, traces)
+        ))
+        return [
+            self._record(trace, self._build_result(prompt, analysis, similar_prompts, text, route), similar_prompts)
+            for prompt, analysis, similar_prompts, text, (route, _), trace
+            in zip(prompts, analyses, similar, optimized, routed, traces)
+        ]
+    
+    async def _agenerate(self, user_prompt: str, analysis: Dict, similar_prompts: Dict, deadline: float = None,
+                         trace: RequestTrace = None, timeout: float = None) -> str:
+        """deadline: mutlak sınır (loop.time()), kuyruk beklemesi dahil; timeout: sıra geldikten sonra
+        model çağrısına (tüm denemeler) tanınan süre"""
+        if not self.gemini_agent.available:
+            return None
+        trace = trace if trace is not None else RequestTrace('async')
+        
+        loop = asyncio.get_running_loop()
+        remaining = deadline - loop.time() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            trace.fields['error'] = 'deadline'
+            return None
+        
+        try:
+            # Deadline semaphore/rate limiter beklemesini de kapsar
+            with trace.stage('generate'):
+                return await asyncio.wait_for(
+                    self._limited_generate(user_prompt, analysis, similar_prompts, trace.fields, timeout), remaining
+                )
+        except asyncio.TimeoutError:
+            print("⏱️ Gemini deadline aşıldı - fallback kullanılıyor")
+            trace.fields['error'] = 'deadline'
+            return None
+    
+    async def _limited_generate(self, user_prompt: str, analysis: Dict, similar_prompts: Dict,
+                                trace_fields: Dict = None, timeout: float = None) -> str:
+        semaphore, bucket = self._async_limits()
+        async with semaphore:
+            if bucket is not None:
+                await bucket.acquire()
+            return await self.gemini_agent.agenerate_optimized_prompt(
+                user_prompt, _similar_examples(similar_prompts), analysis, timeout=timeout, trace=trace_fields
+            )
+    
+    def _async_limits(self):
+        # asyncio primitive'leri event loop'a bağlı - her loop için ayrı semaphore/bucket
+        loop = asyncio.get_running_loop()
+        limits = self._async_limits_by_loop.get(loop)
+        if limits is None:
+            bucket = AsyncTokenBucket(self.requests_per_second) if self.requests_per_second else None
+            limits = (asyncio.Semaphore(self.max_concurrency), bucket)
+            self._async_limits_by_loop[loop] = limits
+        return limits
+    
+    def _retrieval_filter(self, intent: str) -> Dict:
+        if not self.filter_by_intent:
+            return None
+        types = self.router.EXAMPLE_TYPES_BY_INTENT.get(intent)
+        return {'type': list(types)} if types else None
+    
+    def _retrieve(self, user_prompt: str, n_results: int = 3, intent: str = None) -> Dict:
+        return self._retrieve_batch([user_prompt], n_results, None if intent is None else [intent])[0]
+    
+    def _retrieve_batch(self, prompts: List[str], n_results: int = 3, intents: List[str] = None) -> List[Dict]:
+        """Intent filtresine göre gruplanmış batch retrieval - sorgu başına tek sorguluk sonuç.
+        intents: prompt'larla aynı sırada intent'ler (analiz de kullanacaksa bir kez hesaplanıp verilir)"""
+        if intents is None and self.filter_by_intent:
+            intents = [self.analyzer.detect_intent(prompt) for prompt in prompts]
+        wheres = [self._retrieval_filter(intent) for intent in (intents or [None] * len(prompts))]
+        groups = {}
+        for i, where in enumerate(wheres):
+            groups.setdefault(_normalize_where(where), []).append(i)
+        
+        similar = [None] * len(prompts)
+        for positions in groups.values():
+            batch_results = self.vector_store.search_similar_prompts_batch(
+                [prompts[i] for i in positions], n_results, where=wheres[positions[0]]
+            )
+            for i, result in zip(positions, _split_batch_results(batch_results, len(positions))):
+                similar[i] = result
+        
+        # Filtrelenmiş bölüm n_results'tan küçükse eksikler filtresiz aramadan tamamlanır
+        short = [i for i, where in enumerate(wheres) if where and len(similar[i]['ids'][0]) < n_results]
+        if short:
+            batch_results = self.vector_store.search_similar_prompts_batch([prompts[i] for i in short], n_results)
+            for i, extra in zip(short, _split_batch_results(batch_results, len(short))):
+                similar[i] = _merge_results(similar[i], extra, n_results)
+        return similar
+    
+    def routing_stats(self) -> Dict:
+        """Route dağılımı ve LLM çağrısı yapılmadan cevaplanan trafik oranı"""
+        return self.router.stats()
+    
+    def metrics_snapshot(self) -> Dict:
+        """Aşama başına p50/p95/p99, retrieval kaynağı / route / cache / backend sayaçları ve
+        index'in işlem başına hata sayıları (istek dışı yükleme / güncelleme hataları dahil)"""
+        return dict(self.metrics.snapshot(), index_operation_errors=self.vector_store.error_stats())
+    
+    def metrics_text(self, prefix: str = 'promptlab') -> str:
+        """Prometheus text formatında metrikler"""
+        lines = [f"# TYPE {prefix}_index_operation_errors_total counter"]
+        for operation, count in sorted(self.vector_store.error_stats().items()):
+            lines.append(f'{prefix}_index_operation_errors_total{{operation="{operation}"}} {count}')
+        return self.metrics.prometheus_text(prefix) + "\n".join(lines) + "\n"
+    
+    def _generate(self, user_prompt: str, analysis: Dict, similar_prompts: Dict, trace: RequestTrace = None) -> Dict:
+        trace = trace if trace is not None else RequestTrace('sync')
+        with trace.stage('route'):
+            route, optimized = self.router.route(user_prompt, analysis, similar_prompts)
+        if route == 'model':
+            with trace.stage('generate'):
+                optimized = self.gemini_agent.generate_optimized_prompt(
+                    user_prompt, _similar_examples(similar_prompts), analysis, trace=trace.fields
+                )
+        result = self._build_result(user_prompt, analysis, similar_prompts, optimized, route)
+        return self._record(trace, result, similar_prompts)
+    
+    def _record(self, trace: RequestTrace, result: Dict, similar_prompts: Dict) -> Dict:
+        """İsteğin olayını sink'lere yazar; aşama süreleri sonuca 'timings' olarak eklenir"""
+        route = result['route']
+        trace.fields.update(
+            retrieval_source=similar_prompts.get('source'),
+            index_errors=len(similar_prompts.get('errors') or ()),
+            route=route,
+            # Cache sadece model gerekecekken yoklanır: 'cache' route hit, 'model' route miss demektir
+            cache='hit' if route == 'cache' else 'miss' if route == 'model' else 'skip'
+        )
+        event = trace.event()
+        result['timings'] = event['stages']
+        for sink in self._metrics_sinks:
+            try:
+                sink.record(event)
+            except Exception as e:
+                print(f"⚠️ Metrik yazılamadı ({type(sink).__name__}): {e}")
+        return result
+    
+    def _build_result(self, user_prompt: str, analysis: Dict, similar_prompts: Dict, optimized: str,
+                      route: str = 'model') -> Dict:
+        similar_examples = _similar_examples(similar_prompts)
+        generative_ai_used = self.gemini_agent.available
+        
+        if route == 'skip':
+            # Prompt kalite eşiğinin üzerinde - olduğu gibi döner
+            optimized = user_prompt
+            ai_model = "Kalite Eşiği (Model Atlandı)"
+            rag_mode = "Skipped"
+            generative_ai_used = False
+        elif route == 'example':
+            # En yakın başarılı örnek şablon olarak kullanılır, kullanıcının konusuna uyarlanır
+            optimized = self.fallback_optimizer.adapt_example(user_prompt, optimized, analysis)
+            ai_model = "Benzer Örnek (Retrieval)"
+            rag_mode = "Retrieval"
+            generative_ai_used = False
+        elif route == 'cache':
+            display_name = self.gemini_agent.select_backend(analysis).display_name
+            ai_model = f"{display_name} (Cache)"
+            rag_mode = f"{display_name.split()[0]} RAG"
+        elif self.gemini_agent.available:
             if optimized:
-                ai_model = "Gemini Pro (RAG)"
-                rag_mode = "Gemini RAG"
+                display_name = self.gemini_agent.select_backend(analysis).display_name
+                ai_model = f"{display_name} (RAG)"
+                rag_mode = f"{display_name.split()[0]} RAG"
             else:
                 optimized = self.fallback_optimizer.optimize_prompt(
                     user_prompt, similar_examples, analysis
@@ -333,27 +3193,116 @@ class GeminiPromptLabRAG:
             'similar_examples': similar_prompts,
             'optimized_prompt': optimized,
             'improvement_percentage': improvement,
-            'generative_ai_used': self.gemini_agent.available,
+            'generative_ai_used': generative_ai_used,
             'ai_model': ai_model,
+            'route': route,
             'rag_mode': rag_mode  # ← BU HER ZAMAN VAR!
         }
 
+def _share_trace(batch: RequestTrace, n_requests: int) -> RequestTrace:
+    """Batch'in ortak aşama sürelerinden istek başına pay alan yeni trace; total = bu paylar + isteğin
+    kendi route / generate süreleri (batch başından ölçülmez, batch'teki sırasıyla büyümez)"""
+    trace = RequestTrace(batch.fields['mode'])
+    trace.shared = True
+    trace.stages = {stage: seconds / max(n_requests, 1) for stage, seconds in batch.stages.items()}
+    return trace
+
+def _similar_examples(similar_prompts: Dict) -> List[str]:
+    return similar_prompts['documents'][0] if similar_prompts['documents'][0] else []
+
+async def _resolved(value):
+    return value
+
+def _nearest_distance(similar_prompts: Dict) -> float:
+    distances = similar_prompts.get('distances') or [[]]
+    return float(distances[0][0]) if distances[0] else None
+
+# Arama sonuç anahtarları - 'scores' sadece hybrid aramada (kaynak başına benzerlik + rrf);
+# bunlara ek olarak her sonuçta skaler 'source' (cevabı veren kaynak) bulunur
+RESULT_KEYS = ('ids', 'documents', 'metadatas', 'distances', 'scores')
+
+def _merge_results(primary: Dict, extra: Dict, n_results: int) -> Dict:
+    """Tek sorguluk iki sonucu birleştirir - önce primary, sonra extra'daki yeni id'ler"""
+    keys = [key for key in RESULT_KEYS if key in primary and key in extra]
+    merged = {key: [list(primary[key][0])] for key in keys}
+    seen = set(merged['ids'][0])
+    for i, prompt_id in enumerate(extra['ids'][0]):
+        if len(merged['ids'][0]) >= n_results:
+            break
+        if prompt_id not in seen:
+            seen.add(prompt_id)
+            for key in keys:
+                merged[key][0].append(extra[key][0][i])
+    merged['source'] = primary.get('source') if primary['ids'][0] else extra.get('source')
+    errors = primary.get('errors', []) + extra.get('errors', [])
+    if errors:
+        merged['errors'] = errors
+    return merged
+
+def _split_batch_results(batch_results: Dict, n_queries: int) -> List[Dict]:
+    """Batch arama sonucunu sorgu başına tek sorguluk sonuçlara böler"""
+    keys = [key for key in RESULT_KEYS if key in batch_results or key != 'scores']
+    results = []
+    for i in range(n_queries):
+        result = {key: [batch_results[key][i]] if batch_results.get(key) else [[]] for key in keys}
+        result['source'] = batch_results.get('source')
+        if batch_results.get('errors'):
+            # Batch aramadaki hata her sorguyu etkiledi
+            result['errors'] = list(batch_results['errors'])
+        results.append(result)
+    return results
+
 # ==================== GLOBAL INSTANCE ====================
-GEMINI_KEY = os.environ.get('GEMINI_API_KEY')
+_promptlab = None
+_promptlab_lock = threading.Lock()
+
+def get_promptlab():
+    """Global pipeline - ilk çağrıda (thread-safe) oluşturulur; hata olursa None döner"""
+    global _promptlab
+    if _promptlab is None:
+        with _promptlab_lock:
+            if _promptlab is None:
+                try:
+                    # Kalıcı index dizini - tanımlıysa warm start'ta index diskten yüklenir
+                    # PROMPTLAB_BACKEND=fake: API anahtarı olmadan yük testi
+                    # PROMPTLAB_DATASET: yerleşik örnekler yerine JSONL/CSV/Parquet prompt kütüphanesi
+                    # PROMPTLAB_EMBEDDER: 'hashing' (varsayılan) veya 'st:<model>' (yerel sentence-transformers)
+                    # PROMPTLAB_SEARCH_MODE: 'cascade' (varsayılan) veya 'hybrid' (Chroma + TF-IDF, RRF)
+                    # PROMPTLAB_ANN_NPROBE: büyük korpuslarda IVF ANN araması (recall/gecikme ayarı)
+                    # PROMPTLAB_QUALITY_THRESHOLD: bu overall_score'un üzerindeki prompt'lar için model çağrılmaz
+                    # PROMPTLAB_METRICS_JSONL: istek başına metrik olayları bu dosyaya JSON satırı olarak yazılır
+                    gemini_key = os.environ.get('GEMINI_API_KEY')
+                    threshold = os.environ.get('PROMPTLAB_QUALITY_THRESHOLD')
+                    nprobe = os.environ.get('PROMPTLAB_ANN_NPROBE')
+                    _promptlab = GeminiPromptLabRAG(
+                        gemini_api_key=gemini_key,
+                        index_dir=os.environ.get('PROMPTLAB_INDEX_DIR'),
+                        backend=make_backend(os.environ.get('PROMPTLAB_BACKEND'), gemini_key),
+                        quality_threshold=float(threshold) if threshold else None,
+                        dataset_path=os.environ.get('PROMPTLAB_DATASET'),
+                        ann_nprobe=int(nprobe) if nprobe else None,
+                        embedder=make_embedder(os.environ.get('PROMPTLAB_EMBEDDER')),
+                        search_mode=os.environ.get('PROMPTLAB_SEARCH_MODE') or 'cascade',
+                        metrics_sinks=make_metrics_sinks(os.environ.get('PROMPTLAB_METRICS_JSONL'))
+                    )
+                    print("✅ PromptLab global instance oluşturuldu")
+                except Exception as e:
+                    print(f"❌ PromptLab hatası: {e}")
+    return _promptlab
 
-try:
-    promptlab = GeminiPromptLabRAG(gemini_api_key=GEMINI_KEY)
-    print("✅ PromptLab global instance oluşturuldu")
-except Exception as e:
-    print(f"❌ PromptLab hatası: {e}")
-    promptlab = None
+def __getattr__(name):
+    # Geriye dönük uyumluluk: `from promptlab_model import promptlab` lazy instance'ı döndürür
+    if name == 'promptlab':
+        return get_promptlab()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
     print("\n🧪 Test başlıyor...")
+    promptlab = get_promptlab()
     if promptlab:
         result = promptlab.process_prompt("test prompt")
         print(f"✅ Test başarılı!")
         print(f"   Keys: {list(result.keys())}")
         print(f"   RAG Mode: {result['rag_mode']}")
     else:
-        print("❌ PromptLab yüklenemedi!")
\ No newline at end of file
+        print("❌ PromptLab yüklenemedi!")
@@ -3,6 +3,8 @@ import streamlit as st
 import sys
 import os
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
 st.set_page_config(
@@ -189,14 +191,200 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Model import
+# Model import - hafif; pipeline ilk prompt'ta get_pipeline() ile oluşturulur
 try:
-    from promptlab_model import promptlab
+    import promptlab_model
+    from promptlab_model import gemini_available
     AI_ACTIVE = True
-    GEMINI_MODE = promptlab.gemini_agent.available if promptlab else False
 except Exception as e:
     AI_ACTIVE = False
-    GEMINI_MODE = False
+
+# ==================== PAYLAŞILAN KAYNAKLAR ====================
+# st.cache_resource: process başına tek kopya - tüm oturumlar ve rerun'lar aynı nesneyi kullanır
+
+def index_config() -> tuple:
+    """Index'i belirleyen ayarlar - değişirse index yeniden kurulur"""
+    nprobe = os.environ.get('PROMPTLAB_ANN_NPROBE')
+    return (
+        os.environ.get('PROMPTLAB_INDEX_DIR'),
+        os.environ.get('PROMPTLAB_DATASET'),
+        int(nprobe) if nprobe else None,
+        os.environ.get('PROMPTLAB_EMBEDDER'),
+        os.environ.get('PROMPTLAB_SEARCH_MODE') or 'cascade',
+    )
+
+@st.cache_resource(show_spinner="📚 Prompt index'i yükleniyor...")
+def load_index(index_dir, dataset_path, ann_nprobe, embedder_name, search_mode):
+    return promptlab_model.load_vector_store(
+        index_dir, dataset_path, ann_nprobe, promptlab_model.make_embedder(embedder_name), search_mode
+    )
+
+@st.cache_resource
+def load_response_cache():
+    # Aynı prompt + bağlam için üretilen cevap tüm kullanıcılarla paylaşılır
+    return promptlab_model.ResponseCache()
+
+@st.cache_resource(max_entries=8, show_spinner="🤖 Model hazırlanıyor...")
+def load_pipeline(api_key, backend_name, quality_threshold, config):
+    """API anahtarı / backend başına bir pipeline - index ve cevap cache'i paylaşılır; model istemcisi
+    pipeline'ın kendi anahtarına bağlıdır (GeminiBackend), başka oturumun anahtarı kullanılmaz"""
+    return promptlab_model.GeminiPromptLabRAG(
+        gemini_api_key=api_key,
+        backend=promptlab_model.make_backend(backend_name, api_key),
+        quality_threshold=quality_threshold,
+        response_cache=load_response_cache(),
+        vector_store=load_index(*config),
+        metrics_sinks=promptlab_model.make_metrics_sinks(os.environ.get('PROMPTLAB_METRICS_JSONL')),
+    )
+
+def current_api_key():
+    # Form ile girilen anahtar sadece bu oturumda geçerli; yoksa ortam değişkeni
+    return st.session_state.get('gemini_api_key') or os.environ.get('GEMINI_API_KEY')
+
+def get_pipeline():
+    """Oturumun ayarlarına karşılık gelen paylaşılan pipeline - hata olursa None"""
+    threshold = os.environ.get('PROMPTLAB_QUALITY_THRESHOLD')
+    try:
+        return load_pipeline(
+            current_api_key(),
+            os.environ.get('PROMPTLAB_BACKEND'),
+            float(threshold) if threshold else None,
+            index_config(),
+        )
+    except Exception as e:
+        print(f"❌ PromptLab hatası: {e}")
+        return None
+
+@st.cache_resource
+def load_worker_pool():
+    # Optimizasyonlar tüm oturumların paylaştığı thread pool'da - script thread'i bloklanmaz
+    return ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="promptlab-ui")
+
+GEMINI_MODE = AI_ACTIVE and gemini_available() and bool(current_api_key())
+
+def render_streaming_bubble(placeholder, text):
+    """Akan asistan cevabı - ilk parça gelene kadar typing indicator"""
+    body = text if text else '<div class="typing-indicator"><span></span><span></span><span></span></div>'
+    placeholder.markdown(f"""
+    <div class="chat-message assistant">
+        <div class="avatar">🤖</div>
+        <div class="message">
+            <strong>✨ Prompt'unuz optimize ediliyor...</strong><br><br>
+            {body}
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+# Sohbet geçmişi sınırları - rerun süresi geçmiş uzunluğundan bağımsız kalır
+PAGE_SIZE = 20            # ekranda bir seferde gösterilen mesaj sayısı
+MAX_MESSAGES = 1000       # session'da tutulan kompakt mesaj sayısı (eskiler düşer)
+MAX_STORED_RESULTS = 20   # tam sonucu (benzer örnekler vb.) saklanan son tur sayısı
+WORKER_THREADS = 8        # process genelinde aynı anda işlenen prompt sayısı
+POLL_SECONDS = 0.3        # cevap beklenirken sohbet alanının yenilenme aralığı
+
+def summarize_result(result):
+    """Mesajda sadece ekranda gösterilen alanlar kalır - benzer örnekler vb. result_store'a gider"""
+    analysis = result['analysis']
+    return {
+        'optimized_prompt': result['optimized_prompt'],
+        'original_prompt': result['original_prompt'],
+        'ai_model': result.get('ai_model', 'N/A'),
+        'rag_mode': result.get('rag_mode', 'N/A'),
+        'improvement_percentage': result.get('improvement_percentage', 0),
+        'analysis': {key: analysis[key] for key in ('category', 'intent', 'word_count', 'overall_score')},
+    }
+
+def add_message(message):
+    messages = st.session_state.messages
+    messages.append(message)
+    if len(messages) > MAX_MESSAGES:
+        del messages[:len(messages) - MAX_MESSAGES]
+
+def store_result(turn, result):
+    """Tam sonuç oturum başına sınırlı LRU'da - en eski turlar düşer"""
+    store = st.session_state.result_store
+    store[turn] = result
+    while len(store) > MAX_STORED_RESULTS:
+        store.popitem(last=False)
+
+def run_turn(promptlab, prompt, job):
+    """Worker thread'de çalışır - Streamlit API'si çağrılmaz, akan metin job['text']'e yazılır"""
+    start = time.perf_counter()
+    result = None
+    for event in promptlab.process_prompt_stream(prompt):
+        if event['type'] == 'chunk':
+            job['text'] += event['text']
+        else:
+            result = event['result']
+    job['seconds'] = time.perf_counter() - start
+    return result
+
+def dispatch_next():
+    """Bekleyen iş yoksa sıradaki prompt'u worker pool'a verir"""
+    queue = st.session_state.prompt_queue
+    if st.session_state.job is not None or not queue:
+        return
+    prompt = queue.popleft()
+    add_message({
+        "role": "user",
+        "content": prompt,
+        "timestamp": datetime.now().strftime("%H:%M")
+    })
+    
+    job = {'prompt': prompt, 'text': ''}
+    promptlab = get_pipeline()
+    if promptlab is None:
+        job['future'] = Future()
+        job['future'].set_exception(RuntimeError("PromptLab pipeline yüklenemedi"))
+    else:
+        job['future'] = load_worker_pool().submit(run_turn, promptlab, prompt, job)
+    st.session_state.job = job
+
+def collect_finished_job():
+    """Biten işin sonucunu sohbete ekler ve sıradakini başlatır; iş bittiyse True"""
+    job = st.session_state.job
+    if job is None or not job['future'].done():
+        return False
+    st.session_state.job = None
+    
+    try:
+        result = job['future'].result()
+        # Asistan cevabını ekle - mesajda özet, tam sonuç sınırlı result_store'da
+        st.session_state.turn_id += 1
+        store_result(st.session_state.turn_id, result)
+        add_message({
+            "role": "assistant",
+            "content": f"İşte optimize edilmiş prompt'unuz:",
+            "timestamp": datetime.now().strftime("%H:%M"),
+            "result": summarize_result(result),
+            "turn": st.session_state.turn_id
+        })
+        st.session_state.conversation_count += 1
+    except Exception as e:
+        # Hata mesajı
+        add_message({
+            "role": "assistant",
+            "content": f"❌ Üzgünüm, bir hata oluştu: {str(e)}\n\nLütfen tekrar deneyin.",
+            "timestamp": datetime.now().strftime("%H:%M")
+        })
+    
+    dispatch_next()
+    return True
+
+def submit_prompt(input_key):
+    """Gönder / Enter callback'i: prompt sıraya girer; önceki cevap beklenirken de gönderilebilir"""
+    prompt = st.session_state.get(f"message_input_{input_key}", "").strip()
+    if not prompt:
+        return
+    
+    # Quick prompt'u temizle ve input key'ini güncelle
+    st.session_state.quick_prompt = ""
+    st.session_state.input_key += 1
+    # Yeni tur - görünüm son sayfaya döner
+    st.session_state.visible_messages = PAGE_SIZE
+    
+    st.session_state.prompt_queue.append(prompt)
+    dispatch_next()
 
 # Session state initialization
 if 'messages' not in st.session_state:
@@ -218,6 +406,18 @@ if 'quick_prompt' not in st.session_state:
 if 'input_key' not in st.session_state:
     st.session_state.input_key = 0
 
+if 'result_store' not in st.session_state:
+    st.session_state.result_store = OrderedDict()
+    st.session_state.turn_id = 0
+
+if 'visible_messages' not in st.session_state:
+    st.session_state.visible_messages = PAGE_SIZE
+
+if 'job' not in st.session_state:
+    # job: işlenmekte olan prompt (oturum başına bir tane), prompt_queue: sıradakiler
+    st.session_state.job = None
+    st.session_state.prompt_queue = deque()
+
 # Başlık
 st.markdown("""
 <div style="text-align: center; padding: 20px 0;">
@@ -241,8 +441,8 @@ with st.sidebar:
     st.markdown("---")
     
     # API Key
-    with st.expander("🔑 Gemini API Anahtarı", expanded=not bool(os.environ.get('GEMINI_API_KEY'))):
-        current_key = os.environ.get('GEMINI_API_KEY', '')
+    with st.expander("🔑 Gemini API Anahtarı", expanded=not bool(current_api_key())):
+        current_key = current_api_key() or ''
         
         if current_key:
             st.success("✅ API Anahtarı Aktif")
@@ -260,9 +460,9 @@ with st.sidebar:
                 with col1:
                     if st.form_submit_button("💾 Kaydet"):
                         if api_key:
-                            os.environ['GEMINI_API_KEY'] = api_key
-                            st.success("✅ Kaydedildi!")
-                            time.sleep(0.5)
+                            # Yeni anahtar -> load_pipeline yeni bir model istemcisi kurar (index paylaşılır)
+                            st.session_state.gemini_api_key = api_key
+                            st.session_state.show_api_input = False
                             st.rerun()
                 
                 with col2:
@@ -310,6 +510,11 @@ with st.sidebar:
         st.session_state.conversation_count = 0
         st.session_state.quick_prompt = ""
         st.session_state.input_key += 1
+        st.session_state.result_store.clear()
+        st.session_state.visible_messages = PAGE_SIZE
+        # İşlenmekte olan prompt'un sonucu atılır
+        st.session_state.job = None
+        st.session_state.prompt_queue.clear()
         # Karşılama mesajını tekrar ekle
         st.session_state.messages.append({
             "role": "assistant",
@@ -343,79 +548,145 @@ with st.sidebar:
         else:
             st.info("🔄 Yedek Mod")
         
-        st.metric("Vektör DB", "✅")
-        st.metric("RAG Pipeline", "✅")
+        # Pipeline ilk prompt'ta kurulur - öncesinde metrik yok
+        promptlab = get_pipeline() if st.session_state.conversation_count else None
+        if promptlab is None:
+            st.caption("📈 Metrikler ilk prompt'tan sonra görünür")
+        else:
+            metrics = promptlab.metrics_snapshot()
+            if metrics['requests']:
+                total = metrics['stages']['total']
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Süre p50", f"{total['p50'] * 1000:.0f} ms")
+                with col2:
+                    st.metric("Süre p95", f"{total['p95'] * 1000:.0f} ms")
+                st.caption(" · ".join(
+                    f"{stage}: {metrics['stages'][stage]['p50'] * 1000:.1f} ms"
+                    for stage in ('retrieve', 'analyze', 'route', 'generate') if stage in metrics['stages']
+                ))
+                
+                # Retrieval'ı gerçekte hangi kaynak karşıladı (chroma / tfidf / ann / hybrid / none)
+                sources = metrics['retrieval_source']
+                st.metric("Vektör DB", max(sources, key=sources.get) if sources else "-")
+                st.caption(" · ".join(f"{source}: {count}" for source, count in sources.items()))
+                
+                lookups = metrics['cache'].get('hit', 0) + metrics['cache'].get('miss', 0)
+                hit_ratio = metrics['cache'].get('hit', 0) / lookups * 100 if lookups else 0
+                st.caption(
+                    f"Cache isabet: %{hit_ratio:.0f} · Retry: {metrics['retries']} · "
+                    f"Token: {metrics['prompt_tokens']}/{metrics['output_tokens']} · Hata: {metrics['errors']} · "
+                    f"Index hatası: {sum(metrics['index_operation_errors'].values())}"
+                )
+            
+            routing = promptlab.routing_stats()
+            if routing['total']:
+                st.metric("LLM'siz Cevap", f"%{routing['llm_free_ratio'] * 100:.0f}")
+                st.caption(" · ".join(f"{name}: {routing[name]}" for name in ('example', 'cache', 'skip', 'fallback', 'model')))
     else:
         st.error("❌ Hata")
 
-# Ana chat alanı
+# Ana chat alanı - içerik, gönderim işlendikten sonra chat_view() fragment'ı ile doldurulur
 chat_container = st.container()
 
-with chat_container:
-    # Mesajları göster
-    for i, message in enumerate(st.session_state.messages):
-        role = message["role"]
-        content = message["content"]
-        timestamp = message.get("timestamp", "")
-        
-        if role == "user":
+def render_message(message):
+    role = message["role"]
+    content = message["content"]
+    timestamp = message.get("timestamp", "")
+    
+    if role == "user":
+        st.markdown(f"""
+        <div class="chat-message user">
+            <div class="avatar">👤</div>
+            <div class="message">{content}</div>
+            <div class="timestamp">{timestamp}</div>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        # Eğer optimizasyon sonucu varsa
+        if "result" in message:
+            result = message["result"]
+            
+            # Asistan mesajı
             st.markdown(f"""
-            <div class="chat-message user">
-                <div class="avatar">👤</div>
-                <div class="message">{content}</div>
+            <div class="chat-message assistant">
+                <div class="avatar">🤖</div>
+                <div class="message">
+                    <strong>✨ Prompt'unuz optimize edildi!</strong><br><br>
+                    {result['optimized_prompt']}
+                </div>
                 <div class="timestamp">{timestamp}</div>
             </div>
             """, unsafe_allow_html=True)
-        else:
-            # Eğer optimizasyon sonucu varsa
-            if "result" in message:
-                result = message["result"]
-                
-                # Asistan mesajı
-                st.markdown(f"""
-                <div class="chat-message assistant">
-                    <div class="avatar">🤖</div>
-                    <div class="message">
-                        <strong>✨ Prompt'unuz optimize edildi!</strong><br><br>
-                        {result['optimized_prompt']}
-                    </div>
-                    <div class="timestamp">{timestamp}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Metrikler
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Model", result.get('ai_model', 'N/A').split('(')[0].strip())
-                with col2:
-                    st.metric("RAG", result.get('rag_mode', 'N/A'))
-                with col3:
-                    st.metric("İyileşme", f"%{result.get('improvement_percentage', 0):.0f}")
-                with col4:
-                    kelime_artisi = len(result['optimized_prompt'].split()) - len(result['original_prompt'].split())
-                    st.metric("Kelime", f"+{kelime_artisi}")
+            
+            # Metrikler
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Model", result.get('ai_model', 'N/A').split('(')[0].strip())
+            with col2:
+                st.metric("RAG", result.get('rag_mode', 'N/A'))
+            with col3:
+                st.metric("İyileşme", f"%{result.get('improvement_percentage', 0):.0f}")
+            with col4:
+                kelime_artisi = len(result['optimized_prompt'].split()) - len(result['original_prompt'].split())
+                st.metric("Kelime", f"+{kelime_artisi}")
+            
+            # Analiz detayları
+            with st.expander("📊 Detaylı Analiz"):
+                col_a, col_b = st.columns(2)
+                with col_a:
+                    st.write("**Orijinal Prompt:**")
+                    st.info(result['original_prompt'])
+                with col_b:
+                    st.write("**Analiz:**")
+                    st.write(f"- Kategori: {result['analysis']['category']}")
+                    st.write(f"- Amaç: {result['analysis']['intent']}")
+                    st.write(f"- Kelime: {result['analysis']['word_count']}")
+                    st.write(f"- Skor: {result['analysis']['overall_score']:.2f}/1.0")
                 
-                # Analiz detayları
-                with st.expander("📊 Detaylı Analiz"):
-                    col_a, col_b = st.columns(2)
-                    with col_a:
-                        st.write("**Orijinal Prompt:**")
-                        st.info(result['original_prompt'])
-                    with col_b:
-                        st.write("**Analiz:**")
-                        st.write(f"- Kategori: {result['analysis']['category']}")
-                        st.write(f"- Amaç: {result['analysis']['intent']}")
-                        st.write(f"- Kelime: {result['analysis']['word_count']}")
-                        st.write(f"- Skor: {result['analysis']['overall_score']:.2f}/1.0")
-            else:
-                # Normal asistan mesajı
-                st.markdown(f"""
-                <div class="chat-message assistant">
-                    <div class="avatar">🤖</div>
-                    <div class="message">{content}</div>
-                    <div class="timestamp">{timestamp}</div>
-                </div>
-                """, unsafe_allow_html=True)
+                # Benzer örnekler sadece son MAX_STORED_RESULTS tur için saklanır
+                full_result = st.session_state.result_store.get(message.get('turn'))
+                if full_result is not None:
+                    metadatas = full_result['similar_examples']['metadatas'][0]
+                    if metadatas:
+                        st.caption("🔎 Benzer örnekler: " + ", ".join(meta.get('act', '-') for meta in metadatas))
+        else:
+            # Normal asistan mesajı
+            st.markdown(f"""
+            <div class="chat-message assistant">
+                <div class="avatar">🤖</div>
+                <div class="message">{content}</div>
+                <div class="timestamp">{timestamp}</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+def chat_view():
+    """Sohbet alanı. Cevap beklenirken sadece bu fragment POLL_SECONDS aralıkla yeniden çalışır -
+    akan metin, sıra durumu ve biten cevaplar tam sayfa rerun olmadan gelir."""
+    finished = collect_finished_job()
+    
+    # Sadece son visible_messages mesaj çizilir - daha eskiler istenirse sayfa sayfa açılır
+    messages = st.session_state.messages
+    hidden = len(messages) - st.session_state.visible_messages
+    if hidden > 0:
+        if st.button(f"⬆️ Önceki {min(PAGE_SIZE, hidden)} mesajı göster ({hidden} gizli)",
+                     use_container_width=True, key="show_older"):
+            st.session_state.visible_messages += PAGE_SIZE
+            st.rerun()
+    
+    for message in messages[-st.session_state.visible_messages:]:
+        render_message(message)
+    
+    job = st.session_state.job
+    if job is not None:
+        render_streaming_bubble(st.empty(), job['text'])
+    queue = st.session_state.prompt_queue
+    if queue:
+        st.caption(f"⏳ Sırada {len(queue)} prompt: " + " · ".join(prompt[:40] for prompt in queue))
+    
+    if finished and job is None:
+        # Sıra boşaldı - tek tam rerun ile polling durur, sidebar istatistikleri güncellenir
+        st.rerun()
 
 # Chat input - Form ile Enter desteği
 st.markdown("---")
@@ -433,7 +704,7 @@ with st.form(key="chat_form", clear_on_submit=True):  # clear_on_submit=True yap
     
     with col_input:
         # Dynamic key ile text input - quick_prompt değiştiğinde yeniden render olacak
-        user_input = st.text_input(
+        st.text_input(
             "💬 Prompt",
             value=st.session_state.quick_prompt,  # Doğrudan session state'ten al
             placeholder="💬 Buraya yazın ve Enter'a basın...",
@@ -445,7 +716,9 @@ with st.form(key="chat_form", clear_on_submit=True):  # clear_on_submit=True yap
     with col_buttons:
         col_send, col_clear = st.columns(2)
         with col_send:
-            send_button = st.form_submit_button("📤", use_container_width=True, type="primary")
+            # Callback script'ten önce çalışır - gönderilen değer o anki dinamik key'den okunur
+            st.form_submit_button("📤", use_container_width=True, type="primary",
+                                  on_click=submit_prompt, args=(st.session_state.input_key,))
         with col_clear:
             clear_button = st.form_submit_button("🗑️", use_container_width=True)
 
@@ -455,51 +728,9 @@ if clear_button:
     st.session_state.input_key += 1  # Input'u yeniden render et
     st.rerun()
 
-# Gönder butonuna basıldığında veya Enter'a basıldığında
-if send_button and user_input.strip():
-    prompt = user_input.strip()
-    
-    # Quick prompt'u temizle ve input key'ini güncelle
-    st.session_state.quick_prompt = ""
-    st.session_state.input_key += 1
-    
-    # Kullanıcı mesajını ekle
-    st.session_state.messages.append({
-        "role": "user",
-        "content": prompt,
-        "timestamp": datetime.now().strftime("%H:%M")
-    })
-    
-    # Typing indicator göster
-    with st.spinner("🤖 Düşünüyorum..."):
-        time.sleep(0.5)
-        
-        try:
-            # RAG ile işle
-            result = promptlab.process_prompt(prompt)
-            
-            # Asistan cevabını ekle
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"İşte optimize edilmiş prompt'unuz:",
-                "timestamp": datetime.now().strftime("%H:%M"),
-                "result": result
-            })
-            
-            st.session_state.conversation_count += 1
-            
-            # Başarı sesi (optional)
-            st.balloons()
-            
-        except Exception as e:
-            # Hata mesajı
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"❌ Üzgünüm, bir hata oluştu: {str(e)}\n\nLütfen tekrar deneyin.",
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
-    
-    st.rerun()
+with chat_container:
+    busy = st.session_state.job is not None or bool(st.session_state.prompt_queue)
+    st.fragment(run_every=POLL_SECONDS if busy else None)(chat_view)()
 
 # Yardım alanı
 with st.expander("❓ Nasıl Kullanılır?"):
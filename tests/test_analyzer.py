@@ -0,0 +1,48 @@
+# tests/test_analyzer.py
+"""analyze_batch, analyze_prompt ile birebir aynı olmalı - hem küçük batch'lerde (regex yolu) hem büyüklerde
+(pyarrow kuruluysa Arrow yolu)"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import _ARROW_MIN_BATCH, DEFAULT_PROMPTS, PromptAnalyzer, VectorStore
+
+# İç içe anahtar kelimeler, Unicode boşluk/rakam/harf, tırnak/parantez sonrası belirteçler, ayırıcı karakterler
+EDGE_CASES = [
+    "(örnek) 3 madde", "\"sen bir\" öğretmen", "İSTANBUL hakkında ΟΔΟΣ yaz", "", "   ", "a",
+    "kod yazmak 12ab34", "json5 örnek\ttablo\nliste", "5örnek", "x\x1fy sen bir", "x\x1ey kod yaz",
+    "adım adım adım adım", "'en az' 3 en fazla ٣", "örnek tablo kod yaz", "öğretmen nasıl öğretir?",
+]
+TOKENS = ["bana", "python", "öğret", "yaz", "kod", "sen", "bir", "rolünde", "oluştur", "nasıl", "(", "\"", "'",
+          "3", "42", "İzmir", "ÇALIŞ", "örnek", "tablo", "en", "az", "_x", "e-posta", "ΣΟΦΟΣ"]
+
+
+def random_prompts(n: int, seed: int = 5):
+    rng = random.Random(seed)
+    return ["".join(rng.choice([" ", "", "  "]) + rng.choice(TOKENS) for _ in range(rng.randint(0, 15)))
+            for _ in range(n)]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    store = VectorStore()
+    store.collection = None
+    store.add_prompts(DEFAULT_PROMPTS)
+    return store
+
+
+@pytest.mark.parametrize("n", [50, _ARROW_MIN_BATCH + 50])
+@pytest.mark.parametrize("with_corpus", [False, True])
+def test_analyze_batch_matches_analyze_prompt(n, with_corpus, corpus):
+    analyzer = PromptAnalyzer(corpus=corpus if with_corpus else None)
+    prompts = EDGE_CASES + random_prompts(n) + EDGE_CASES
+    # Aynı prompt'un mesafesi aynı (batch tekrarları ilk görülen satırın mesafesiyle analiz eder)
+    distances = [None if len(prompt) % 3 else (len(prompt) % 10) / 10 for prompt in prompts]
+
+    batch = analyzer.analyze_prompts(prompts, distances)
+
+    assert batch == [analyzer.analyze_prompt(prompt, distance) for prompt, distance in zip(prompts, distances)]
@@ -0,0 +1,44 @@
+# tests/test_metrics.py
+"""İstek başına aşama süreleri - batch yollarında total, isteğin kendi aşamalarının toplamı olmalı"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import FakeBackend, GeminiPromptLabRAG, ResponseCache
+
+LATENCY = 0.03
+PROMPTS = [f"prompt {i} için python öğret" for i in range(6)]
+
+
+def make_pipeline() -> GeminiPromptLabRAG:
+    backend = FakeBackend(latency_mean=LATENCY, latency_jitter=0.0, tokens_per_second=None)
+    # 'example' route'u kapalı ve cache tek girişlik - her istek modele gider
+    return GeminiPromptLabRAG(backend=backend, response_cache=ResponseCache(max_entries=1), example_distance=None)
+
+
+def assert_total_is_stage_sum(results):
+    for result in results:
+        assert result['route'] == 'model'
+        timings = result['timings']
+        stage_sum = sum(seconds for stage, seconds in timings.items() if stage != 'total')
+        assert abs(timings['total'] - stage_sum) < 0.005, timings
+        # Batch'teki sıradan bağımsız: bir model çağrısı + küçük pay
+        assert timings['total'] < 2 * LATENCY, timings
+
+
+def test_process_batch_total_matches_stage_sum():
+    assert_total_is_stage_sum(make_pipeline().process_batch(PROMPTS))
+
+
+def test_aprocess_batch_total_matches_stage_sum():
+    assert_total_is_stage_sum(asyncio.run(make_pipeline().aprocess_batch(PROMPTS)))
+
+
+def test_batch_metrics_total_not_inflated():
+    pipeline = make_pipeline()
+    pipeline.process_batch(PROMPTS)
+    total = pipeline.metrics_snapshot()['stages']['total']
+    assert total['count'] == len(PROMPTS)
+    assert total['mean'] < 2 * LATENCY
@@ -0,0 +1,85 @@
+# tests/test_vector_store.py
+"""VectorStore artımlı güncelleme / silme regresyonları (sadece TF-IDF, Chroma kapalı)"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promptlab_model import DEFAULT_PROMPTS, VectorStore
+
+
+def make_store() -> VectorStore:
+    store = VectorStore()
+    store.collection = None
+    store.add_prompts(DEFAULT_PROMPTS)
+    return store
+
+
+def test_delete_after_upserts_past_refit_threshold():
+    store = make_store()
+    # İlk upsert drift eşiğini aşar (refit bekler), ikincisi matrise satır eklemeden id ekler
+    store.upsert_prompts([{'act': 'Yeni', 'prompt': f'Yeni prompt {i}: blog yazısı taslağı', 'type': 'writing'}
+                          for i in range(5)])
+    store.upsert_prompts([{'act': 'Tek', 'prompt': 'Python ile veri görselleştirme anlat', 'type': 'coding'}])
+    target = store.ids[0]
+    n_ids = len(store.ids)
+
+    assert store.delete_prompts([target]) == [target]
+
+    assert len(store.ids) == len(store.documents) == len(store.metadatas) == n_ids - 1
+    assert target not in store._id_to_row
+    results = store.search_similar_prompts('Python ile veri görselleştirme', n_results=3)
+    assert results['source'] == 'tfidf'
+    assert store.doc_matrix.shape[0] == len(store.ids)
+    assert 'errors' not in results
+    assert target not in results['ids'][0]
+
+
+def test_delete_keeps_rows_aligned_without_refit():
+    store = make_store()
+    target = store.ids[2]
+    before = store.doc_matrix.shape[0]
+
+    store.delete_prompts([target])
+
+    assert store.doc_matrix.shape[0] == before - 1 == len(store.ids)
+    for row in range(len(store.ids)):
+        document = store.documents[row]
+        assert store.search_similar_prompts(document, n_results=1)['ids'][0][0] == store.ids[row]
+
+
+def test_concurrent_search_during_upsert_and_delete():
+    store = VectorStore(refit_threshold=0.05)
+    store.collection = None
+    store.add_prompts(DEFAULT_PROMPTS)
+    stop = threading.Event()
+    failures = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                for where in (None, {'type': 'coding'}):
+                    results = store.search_similar_prompts('python veri blog yazısı', n_results=3, where=where)
+                    if results['source'] != 'tfidf':
+                        failures.append(results.get('errors'))
+            except Exception as e:
+                failures.append(repr(e))
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        # Sık refit (düşük eşik), artımlı ekleme ve silme arama thread'leriyle yarışır
+        for i in range(150):
+            ids = store.upsert_prompts([{'act': 'Yeni', 'prompt': f'Yeni konu {i}: python veri {i * 7}',
+                                         'type': 'coding'}])
+            if i % 3 == 0:
+                store.delete_prompts(ids)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert failures == []
+    assert store.error_stats() == {}